@@ -1,18 +1,41 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, jsonify
+import time
+app_import_started = time.perf_counter()
+from flask import Flask, render_template, redirect, url_for, request, flash, session, jsonify, stream_with_context
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
-from langchain_community.document_loaders import WebBaseLoader
 import logging
 from dotenv import load_dotenv
-from git import Repo
 import shutil
 from werkzeug.utils import secure_filename
-import boto3
 from urllib.parse import urlparse
-from botocore import UNSIGNED
-from botocore.client import Config
-import PyPDF2
-import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import fnmatch
+import codecs
+import gzip
+import zlib
+import tempfile
+import re
+import json
+import uuid
+import io
+from collections import deque
+import asyncio
+import urllib.robotparser
+from urllib.parse import urljoin, urldefrag
+from html.parser import HTMLParser
+import sys
+import importlib
+import resource
+import socket
+import multiprocessing
+import signal
 
 load_dotenv()
 
@@ -22,22 +45,317 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 
 API_URL = os.getenv('API_URL')
 
+# Upstream API client settings (per worker process)
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 10))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 30))
+UPSTREAM_GET_RETRIES = int(os.getenv('UPSTREAM_GET_RETRIES', 2))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv('UPSTREAM_RETRY_BACKOFF', 0.3))
+
+# Token validation cache settings (seconds / entries)
+AUTH_CHECK_PATH = os.getenv('AUTH_CHECK_PATH', '/user/id')
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+AUTH_CACHE_NEGATIVE_TTL = int(os.getenv('AUTH_CACHE_NEGATIVE_TTL', 30))
+AUTH_CACHE_MAX_SIZE = int(os.getenv('AUTH_CACHE_MAX_SIZE', 1024))
+
+# Premium entitlement cache settings; entries are refreshed in the background
+# once they are within PREMIUM_REFRESH_AHEAD seconds of expiring
+PREMIUM_CACHE_TTL = int(os.getenv('PREMIUM_CACHE_TTL', 120))
+PREMIUM_REFRESH_AHEAD = int(os.getenv('PREMIUM_REFRESH_AHEAD', 30))
+
+# Pack listings are cached per user for a few seconds
+PACK_CACHE_TTL = int(os.getenv('PACK_CACHE_TTL', 5))
+
+# Bucket dump settings; a cap of 0 means unlimited
+DUMP_WORKERS = int(os.getenv('DUMP_WORKERS', 16))
+DUMP_MAX_OBJECTS = int(os.getenv('DUMP_MAX_OBJECTS', 0))
+DUMP_MAX_BYTES = int(os.getenv('DUMP_MAX_BYTES', 0))
+DUMP_MANIFEST_FLUSH_SECONDS = 5
+# Dry-run manifests stop listing after this many keys so a huge bucket cannot tie up a request
+DUMP_PREVIEW_MAX_LISTED = int(os.getenv('DUMP_PREVIEW_MAX_LISTED', 100000))
+
+# Shared S3 clients and single-object transfer tuning. Signed requests use the server's AWS credentials,
+# so they are off unless explicitly allowed.
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))
+S3_ALLOW_SIGNED = os.getenv('S3_ALLOW_SIGNED', 'false').lower() == 'true'
+S3_TRANSFER_CONCURRENCY = int(os.getenv('S3_TRANSFER_CONCURRENCY', 10))
+S3_MULTIPART_CHUNK_BYTES = int(os.getenv('S3_MULTIPART_CHUNK_BYTES', 16 * 1024 * 1024))
+
+# Streaming bucket ingest holds each object in memory, so objects above this size are skipped
+BUCKET_STREAM_MAX_OBJECT_BYTES = int(os.getenv('BUCKET_STREAM_MAX_OBJECT_BYTES', 50 * 1024 * 1024))
+BUCKET_STREAM_WORKERS = int(os.getenv('BUCKET_STREAM_WORKERS', 8))
+
+# Background job settings; job state is kept on disk so any worker can report it
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_STORE_DIR = os.getenv('JOB_STORE_DIR', os.path.join(os.getcwd(), 'job_store'))
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 3600))
+JOB_SAVE_INTERVAL = 0.5
+# Unfinished jobs are re-saved every JOB_HEARTBEAT_SECONDS; a job whose heartbeat is older than
+# JOB_HEARTBEAT_TIMEOUT, or whose worker process is gone, died with its worker
+JOB_HEARTBEAT_SECONDS = int(os.getenv('JOB_HEARTBEAT_SECONDS', 30))
+JOB_HEARTBEAT_TIMEOUT = int(os.getenv('JOB_HEARTBEAT_TIMEOUT', 3 * JOB_HEARTBEAT_SECONDS))
+
+# Per-user scratch directories for clones, bucket dumps and downloads; a quota of 0 disables the limit
+WORKSPACE_ROOT = os.getenv('WORKSPACE_ROOT', os.path.join(os.getcwd(), 'workspaces'))
+WORKSPACE_QUOTA_BYTES = int(os.getenv('WORKSPACE_QUOTA_BYTES', 2 * 1024 * 1024 * 1024))
+WORKSPACE_TTL_SECONDS = int(os.getenv('WORKSPACE_TTL_SECONDS', 6 * 60 * 60))
+WORKSPACE_SWEEP_INTERVAL = int(os.getenv('WORKSPACE_SWEEP_INTERVAL', 300))
+
+# Cleared directories are renamed into a tombstone folder (on the same filesystem as the workspaces)
+# and deleted in the background, a batch at a time
+TOMBSTONE_DIR = os.getenv('TOMBSTONE_DIR', os.path.join(WORKSPACE_ROOT, '.tombstones'))
+TOMBSTONE_REAP_INTERVAL = int(os.getenv('TOMBSTONE_REAP_INTERVAL', 60))
+TOMBSTONE_REAP_BATCH = int(os.getenv('TOMBSTONE_REAP_BATCH', 500))
+TOMBSTONE_REAP_PAUSE = float(os.getenv('TOMBSTONE_REAP_PAUSE', 0.05))
+
+# On-disk cache of extracted document text, evicted least-recently-used first
+EXTRACT_CACHE_DIR = os.getenv('EXTRACT_CACHE_DIR', os.path.join(os.getcwd(), 'extract_cache'))
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv('EXTRACT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Process pool used to extract documents in parallel; timeout is per file, in seconds
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 1))
+EXTRACT_TIMEOUT = float(os.getenv('EXTRACT_TIMEOUT', 120))
+
+# Default clone depth for /fetch-repo; 0 clones full history
+REPO_CLONE_DEPTH = int(os.getenv('REPO_CLONE_DEPTH', 1))
+
+# Repository file index settings
+REPO_INDEX_PAGE_SIZE = int(os.getenv('REPO_INDEX_PAGE_SIZE', 500))
+REPO_INDEX_FILENAME = '.packman_index.json'
+REPO_INDEX_PRUNED_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', 'vendor', 'third_party',
+    '__pycache__', '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache', '.idea', '.vscode'
+}
+
+# Per-file size cap for repository file reads, and the largest file kept in the hot-file cache
+REPO_FILE_MAX_BYTES = int(os.getenv('REPO_FILE_MAX_BYTES', 2 * 1024 * 1024))
+REPO_FILE_CACHE_ENTRY_MAX_BYTES = int(os.getenv('REPO_FILE_CACHE_ENTRY_MAX_BYTES', 256 * 1024))
+
+# Upload limits (bytes); oversized requests are rejected by werkzeug before they are parsed
+UPLOAD_MAX_FILE_BYTES = int(os.getenv('UPLOAD_MAX_FILE_BYTES', 50 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv('UPLOAD_MAX_REQUEST_BYTES', 200 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_REQUEST_BYTES
+
+# Chunked pack publishing: chunk size before compression, and retry rounds for missing chunks
+PACK_UPLOAD_CHUNK_BYTES = int(os.getenv('PACK_UPLOAD_CHUNK_BYTES', 4 * 1024 * 1024))
+PACK_UPLOAD_MAX_ROUNDS = int(os.getenv('PACK_UPLOAD_MAX_ROUNDS', 3))
+PACK_UPLOAD_MAX_CHUNKS = int(os.getenv('PACK_UPLOAD_MAX_CHUNKS', 256))
+# Staged packs are parsed in memory for dedup and deltas, so they are held to the inline request limit
+PACK_UPLOAD_MAX_BYTES = min(int(os.getenv('PACK_UPLOAD_MAX_BYTES', UPLOAD_MAX_REQUEST_BYTES)), UPLOAD_MAX_REQUEST_BYTES)
+UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', os.path.join(os.getcwd(), 'upload_staging'))
+UPLOAD_STAGING_RETENTION_SECONDS = int(os.getenv('UPLOAD_STAGING_RETENTION_SECONDS', 24 * 60 * 60))
+
+# Manifests of what was last published per pack, used to send deltas on republish
+PACK_MANIFEST_DIR = os.getenv('PACK_MANIFEST_DIR', os.path.join(os.getcwd(), 'pack_manifests'))
+
+# Optional splitting of pack contents into retrieval-sized chunks before publishing
+PACK_CHUNKING_DEFAULT = os.getenv('PACK_CHUNKING_DEFAULT', 'false').lower() == 'true'
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
+
+# Link preview crawling: bounds, per-host politeness and the on-disk HTTP cache
+CRAWL_MAX_DEPTH = int(os.getenv('CRAWL_MAX_DEPTH', 2))
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', 50))
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', 16))
+CRAWL_HOST_CONCURRENCY = int(os.getenv('CRAWL_HOST_CONCURRENCY', 4))
+CRAWL_HOST_INTERVAL = float(os.getenv('CRAWL_HOST_INTERVAL', 0.1))
+CRAWL_TIMEOUT = float(os.getenv('CRAWL_TIMEOUT', 15))
+CRAWL_TOTAL_TIMEOUT = float(os.getenv('CRAWL_TOTAL_TIMEOUT', 120))
+CRAWL_MAX_PAGE_BYTES = int(os.getenv('CRAWL_MAX_PAGE_BYTES', 5 * 1024 * 1024))
+CRAWL_USER_AGENT = os.getenv('CRAWL_USER_AGENT', 'SourceboxPackman/1.0')
+CRAWL_CACHE_DIR = os.getenv('CRAWL_CACHE_DIR', os.path.join(os.getcwd(), 'crawl_cache'))
+CRAWL_CACHE_TTL = int(os.getenv('CRAWL_CACHE_TTL', 300))
+CRAWL_CACHE_RETENTION_SECONDS = int(os.getenv('CRAWL_CACHE_RETENTION_SECONDS', 86400))
+ROBOTS_CACHE_TTL = int(os.getenv('ROBOTS_CACHE_TTL', 3600))
+
+# Heavy integrations are imported on first use so workers that only serve pages boot fast and stay small.
+# PRELOAD_INTEGRATIONS imports them at startup instead (pair it with gunicorn's preload_app so forked
+# workers share the loaded modules).
+PRELOAD_INTEGRATIONS = os.getenv('PRELOAD_INTEGRATIONS', 'false').lower() == 'true'
+LAZY_INTEGRATIONS = (
+    'boto3', 'boto3.s3.transfer', 'botocore', 'botocore.config', 'botocore.exceptions',
+    'git', 'PyPDF2', 'aiohttp', 'langchain_text_splitters'
+)
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 
+import_timings = {}
+import_lock = threading.Lock()
+
+
+# Import a module on first use, recording how long the first import took. import_module is called
+# every time because it waits for a module another thread is still importing; sys.modules does not.
+def lazy_import(name):
+    if name in import_timings:
+        return importlib.import_module(name)
+    with import_lock:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        import_timings.setdefault(name, round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+
+# Thread-safe LRU cache where every entry expires after a TTL
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Shared keep-alive session for all upstream API calls, created once per worker process
+upstream_session = None
+upstream_session_pid = None
+upstream_session_lock = threading.Lock()
+
+# Per-endpoint latency counters for upstream calls
+upstream_stats = {}
+upstream_stats_lock = threading.Lock()
+
+
+def get_upstream_session():
+    global upstream_session, upstream_session_pid
+    with upstream_session_lock:
+        # Connection pools must not be shared across forked gunicorn workers
+        if upstream_session is None or upstream_session_pid != os.getpid():
+            retry = Retry(
+                total=UPSTREAM_GET_RETRIES,
+                backoff_factor=UPSTREAM_RETRY_BACKOFF,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET', 'HEAD']),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE, max_retries=retry)
+            upstream_session = requests.Session()
+            upstream_session.mount('http://', adapter)
+            upstream_session.mount('https://', adapter)
+            upstream_session_pid = os.getpid()
+        return upstream_session
+
+
+def record_upstream_latency(label, elapsed_ms, error=False):
+    with upstream_stats_lock:
+        stats = upstream_stats.setdefault(label, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if error:
+            stats['errors'] += 1
+
+
+# Send a request to the upstream API through the pooled session
+def api_request(method, path, **kwargs):
+    kwargs.setdefault('timeout', (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+    # Group latencies by route, not by individual ids
+    route = re.sub(r'/(\d+|[0-9a-fA-F-]{16,})(?=/|$)', '/<id>', path)
+    label = f"{method} {route}"
+    start = time.perf_counter()
+    try:
+        response = get_upstream_session().request(method, f"{API_URL}{path}", **kwargs)
+    except requests.RequestException:
+        record_upstream_latency(label, (time.perf_counter() - start) * 1000, error=True)
+        raise
+    record_upstream_latency(label, (time.perf_counter() - start) * 1000, error=response.status_code >= 500)
+    return response
+
+
+def api_get(path, **kwargs):
+    return api_request('GET', path, **kwargs)
+
+
+def api_post(path, **kwargs):
+    return api_request('POST', path, **kwargs)
+
+
+def api_delete(path, **kwargs):
+    return api_request('DELETE', path, **kwargs)
+
+
+# Cached token validation results, keyed by a hash of the access token
+auth_cache = TTLCache(AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL)
+
+# Cached user id / premium status, keyed the same way as auth_cache
+premium_cache = TTLCache(AUTH_CACHE_MAX_SIZE, PREMIUM_CACHE_TTL)
+premium_refreshing = set()
+premium_refreshing_lock = threading.Lock()
+
+# Combined regular/code pack listings per user, plus the pool that fetches them
+pack_cache = TTLCache(AUTH_CACHE_MAX_SIZE, PACK_CACHE_TTL)
+pack_fetch_executor = ThreadPoolExecutor(max_workers=UPSTREAM_POOL_SIZE, thread_name_prefix='pack-catalog')
+
+
+# Never keep raw tokens around as cache keys
+def token_cache_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
 def check_authentication():
     access_token = session.get('access_token')
     if access_token:
+        cache_key = token_cache_key(access_token)
+        cached = auth_cache.get(cache_key)
+        if cached is not None:
+            if cached['valid']:
+                return True
+            session.pop('access_token', None)
+            flash('Session expired, please login again', 'danger')
+            return False
+
         headers = {'Authorization': f'Bearer {access_token}'}
         try:
-            response = requests.get(f"{API_URL}/user_history", headers=headers)
+            # Probe a lightweight endpoint instead of downloading the user's history
+            response = api_get(AUTH_CHECK_PATH, headers=headers)
             if response.status_code == 200:
+                try:
+                    user_id = response.json().get('user_id')
+                except ValueError:
+                    user_id = None
+                auth_cache.set(cache_key, {'valid': True, 'user_id': user_id})
                 return True
             else:
                 logger.error(f"Authentication check failed: {response.text}")
+                # Only a rejected token logs the user out (and is remembered for a short while);
+                # rate limiting and upstream errors keep the session so the next request retries
+                if response.status_code not in (401, 403):
+                    flash('Could not verify your session right now, please try again', 'danger')
+                    return False
+                auth_cache.set(cache_key, {'valid': False, 'user_id': None}, ttl=AUTH_CACHE_NEGATIVE_TTL)
+                premium_cache.pop(cache_key)
                 session.pop('access_token', None)
                 flash('Session expired, please login again', 'danger')
                 return False
@@ -52,6 +370,45 @@ def check_authentication():
 
 
 
+# Fetch user id (unless already known) and premium status from the upstream API
+def fetch_entitlement(token, user_id=None):
+    headers = {'Authorization': f'Bearer {token}'}
+    if user_id is None:
+        user_id_response = api_get("/user/id", headers=headers)
+        if user_id_response.status_code != 200:
+            raise Exception('Failed to retrieve user ID')
+        user_id = user_id_response.json().get('user_id')
+
+    premium_status_response = api_get(f"/user/{user_id}/premium/status", headers=headers)
+    if premium_status_response.status_code != 200:
+        raise Exception('Failed to verify premium status')
+
+    return {
+        'user_id': user_id,
+        'premium_status': premium_status_response.json().get('premium_status', False),
+        'fetched_at': time.monotonic()
+    }
+
+
+# Refresh a cached entitlement off the request thread before it expires
+def schedule_entitlement_refresh(token, cache_key, user_id):
+    with premium_refreshing_lock:
+        if cache_key in premium_refreshing:
+            return
+        premium_refreshing.add(cache_key)
+
+    def refresh():
+        try:
+            premium_cache.set(cache_key, fetch_entitlement(token, user_id))
+        except Exception as e:
+            logger.warning(f"Background premium status refresh failed: {e}")
+        finally:
+            with premium_refreshing_lock:
+                premium_refreshing.discard(cache_key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
 # Utility function to check if user is premium
 def is_premium_user():
     token = session.get('access_token')
@@ -59,71 +416,521 @@ def is_premium_user():
         flash('You need to log in to access this feature.', 'danger')
         return False
 
-    headers = {'Authorization': f'Bearer {token}'}
-    try:
-        # Fetch user ID
-        user_id_response = requests.get(f"{API_URL}/user/id", headers=headers)
-        if user_id_response.status_code == 200:
-            user_id = user_id_response.json().get('user_id')
-        else:
-            flash('Failed to retrieve user ID', 'danger')
-            return False
+    cache_key = token_cache_key(token)
+    entitlement = premium_cache.get(cache_key)
+    if entitlement is not None:
+        if time.monotonic() - entitlement['fetched_at'] >= PREMIUM_CACHE_TTL - PREMIUM_REFRESH_AHEAD:
+            schedule_entitlement_refresh(token, cache_key, entitlement['user_id'])
+        return entitlement['premium_status']
 
-        # Check if user is premium
-        premium_status_response = requests.get(f"{API_URL}/user/{user_id}/premium/status", headers=headers)
-        if premium_status_response.status_code == 200:
-            return premium_status_response.json().get('premium_status', False)
-        else:
-            flash('Failed to verify premium status', 'danger')
-            return False
+    # Reuse the user id learned while validating the token, if any
+    auth_entry = auth_cache.get(cache_key) or {}
+    try:
+        entitlement = fetch_entitlement(token, auth_entry.get('user_id'))
     except requests.RequestException as e:
         logger.error(f"Error checking premium status: {e}")
         flash('Error during premium status check.', 'danger')
         return False
+    except Exception as e:
+        flash(str(e), 'danger')
+        return False
 
+    premium_cache.set(cache_key, entitlement)
+    return entitlement['premium_status']
+
+
+
+# Raised inside a job function once cancellation has been requested
+class JobCancelled(Exception):
+    pass
+
+
+JOB_FINISHED_STATES = ('completed', 'failed', 'cancelled')
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+# Unfinished jobs of this process, kept alive by the heartbeat thread
+live_jobs = {}
+live_jobs_lock = threading.Lock()
+job_heartbeat_pid = None
+
+
+def job_state_path(job_id):
+    return os.path.join(JOB_STORE_DIR, f"{job_id}.json")
+
+
+def job_cancel_path(job_id):
+    return os.path.join(JOB_STORE_DIR, f"{job_id}.cancel")
+
+
+# Long-running work (bucket dumps, repo clones) tracked outside the request thread
+class Job:
+    def __init__(self, kind, owner):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = 'queued'
+        self.progress = {'objects_done': 0, 'objects_total': None, 'bytes_done': 0, 'bytes_total': None}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self._cancelled = False
+        self._last_saved = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+        self.save()
+
+    # Cancellation may be requested from any worker process through a marker file
+    def is_cancelled(self):
+        if not self._cancelled and os.path.exists(job_cancel_path(self.id)):
+            self._cancelled = True
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise JobCancelled()
+
+    def to_dict(self):
+        with self._lock:
+            progress = dict(self.progress)
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+
+        objects_per_second = bytes_per_second = eta_seconds = None
+        if elapsed:
+            objects_per_second = progress['objects_done'] / elapsed
+            bytes_per_second = progress['bytes_done'] / elapsed
+            if self.status == 'running':
+                if progress['bytes_total'] and bytes_per_second:
+                    eta_seconds = max(progress['bytes_total'] - progress['bytes_done'], 0) / bytes_per_second
+                elif progress['objects_total'] and objects_per_second:
+                    eta_seconds = max(progress['objects_total'] - progress['objects_done'], 0) / objects_per_second
+
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'owner': self.owner,
+            'status': self.status,
+            'progress': progress,
+            'elapsed_seconds': elapsed,
+            'objects_per_second': objects_per_second,
+            'bytes_per_second': bytes_per_second,
+            'eta_seconds': eta_seconds,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'host': self.host,
+            'pid': self.pid,
+            'heartbeat_at': time.time()
+        }
+
+    # Progress updates are throttled; state changes are always written
+    def save(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_saved < JOB_SAVE_INTERVAL:
+            return
+        self._last_saved = now
+        os.makedirs(JOB_STORE_DIR, exist_ok=True)
+        path = job_state_path(self.id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
 
-def aws_download_single_file(s3_url, local_file_path):
-    # Parse the S3 URL to get the bucket name and object key
-    parsed_url = urlparse(s3_url)
-    bucket_name = parsed_url.netloc
-    object_key = parsed_url.path.lstrip('/')
-    
-    # Create the S3 client with unsigned config for public access
-    s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED))
-    
+# Whether an unfinished job record was left behind by a worker that exited (a crash or a recycle)
+def job_abandoned(job):
+    if job['status'] in JOB_FINISHED_STATES:
+        return False
+    if time.time() - (job.get('heartbeat_at') or 0) > JOB_HEARTBEAT_TIMEOUT:
+        return True
+    return job.get('host') == socket.gethostname() and not process_alive(job['pid'])
+
+
+# Job state as last saved; jobs that died with their worker are reported as failed
+def load_job(job_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+        return None
     try:
-        # Download the file
-        print(f"Downloading {object_key} from bucket {bucket_name} to {local_file_path}")
-        s3.download_file(bucket_name, object_key, local_file_path)
-        print(f"Download complete: {local_file_path}")
-    except s3.exceptions.NoSuchBucket:
-        print(f"Bucket {bucket_name} does not exist.")
-    except s3.exceptions.NoSuchKey:
-        print(f"Object {object_key} does not exist.")
+        with open(job_state_path(job_id), 'r', encoding='utf-8') as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if job_abandoned(job):
+        job['status'] = 'failed'
+        job['error'] = 'The worker running this job exited before it finished'
+        job['finished_at'] = job.get('heartbeat_at')
+    return job
+
+
+# Re-save unfinished jobs from a background thread in each worker process, so their heartbeat stays fresh
+def start_job_heartbeat():
+    global job_heartbeat_pid
+    with live_jobs_lock:
+        if job_heartbeat_pid == os.getpid():
+            return
+        job_heartbeat_pid = os.getpid()
+    threading.Thread(target=beat_jobs_forever, name='job-heartbeat', daemon=True).start()
+
+
+def beat_jobs_forever():
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        with live_jobs_lock:
+            jobs = list(live_jobs.values())
+        for job in jobs:
+            try:
+                job.save(force=True)
+            except Exception as e:
+                logger.error(f"Job {job.id} heartbeat failed: {e}")
+
+
+def run_job(job, target, args, workspace=None):
+    job.status = 'running'
+    job.started_at = time.time()
+    job.save(force=True)
+    try:
+        job.result = target(job, *args)
+        job.status = 'completed'
+    except JobCancelled:
+        logger.info(f"Job {job.id} ({job.kind}) cancelled")
+        job.status = 'cancelled'
     except Exception as e:
-        print(f"Error downloading file: {e}")
+        logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        job.save(force=True)
+        with live_jobs_lock:
+            live_jobs.pop(job.id, None)
+        cancel_path = job_cancel_path(job.id)
+        if os.path.exists(cancel_path):
+            os.remove(cancel_path)
+        if workspace is not None:
+            release_workspace_lease(workspace, job.id)
+
+
+# Remove finished job records older than the retention window
+def prune_jobs():
+    if not os.path.isdir(JOB_STORE_DIR):
+        return
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for name in os.listdir(JOB_STORE_DIR):
+        path = os.path.join(JOB_STORE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
 
 
+# Queue target(job, *args) on the job pool and return the job right away.
+# A job working inside a workspace holds a lease on it so the workspace is not cleared underneath it.
+def submit_job(kind, target, *args, workspace=None):
+    prune_jobs()
+    start_job_heartbeat()
+    job = Job(kind, token_cache_key(session.get('access_token', '')))
+    job.save(force=True)
+    with live_jobs_lock:
+        live_jobs[job.id] = job
+    if workspace is not None:
+        acquire_workspace_lease(workspace, job.id)
+    job_executor.submit(run_job, job, target, args, workspace)
+    return job
 
 
-def aws_download_single_file(bucket_url, local_file_path):
-    # Parse the S3 URL to get the bucket name and file key
-    parsed_url = urlparse(bucket_url)
+def job_accepted_response(job, message):
+    return jsonify({
+        'message': message,
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    }), 202
+
+
+# Workspaces belong to the user (not the token) so they survive logging in again
+def user_storage_key(token):
+    auth_entry = auth_cache.get(token_cache_key(token)) or {}
+    owner = str(auth_entry.get('user_id') or token_cache_key(token))
+    return hashlib.sha256(owner.encode('utf-8')).hexdigest()[:32]
+
+
+workspace_sweeper_pid = None
+workspace_sweeper_lock = threading.Lock()
+
+
+# The current user's scratch directory; every use counts as activity for the idle TTL
+def get_workspace():
+    start_workspace_sweeper()
+    start_tombstone_reaper()
+    workspace = os.path.join(WORKSPACE_ROOT, user_storage_key(session.get('access_token', '')))
+    os.makedirs(workspace, exist_ok=True)
+    with open(os.path.join(workspace, '.last_used'), 'w') as f:
+        f.write(str(time.time()))
+    return workspace
+
+
+def workspace_lease_path(workspace, job_id):
+    return os.path.join(workspace, '.leases', job_id)
+
+
+def acquire_workspace_lease(workspace, job_id):
+    os.makedirs(os.path.join(workspace, '.leases'), exist_ok=True)
+    open(workspace_lease_path(workspace, job_id), 'w').close()
+
+
+def release_workspace_lease(workspace, job_id):
+    try:
+        os.remove(workspace_lease_path(workspace, job_id))
+    except OSError:
+        pass
+
+
+# Ids of unfinished jobs holding the workspace; leases of jobs that died with their worker are dropped
+def workspace_jobs(workspace):
+    lease_dir = os.path.join(workspace, '.leases')
+    try:
+        job_ids = os.listdir(lease_dir)
+    except OSError:
+        return []
+
+    active = []
+    for job_id in job_ids:
+        job = load_job(job_id)
+        if job is not None and job['status'] not in JOB_FINISHED_STATES:
+            active.append(job_id)
+        else:
+            release_workspace_lease(workspace, job_id)
+    return active
+
+
+def workspace_usage(workspace):
+    total = 0
+    for root, dirs, files in os.walk(workspace):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+# Bytes the workspace may still grow by, or None when quotas are disabled
+def workspace_remaining(workspace):
+    if not WORKSPACE_QUOTA_BYTES:
+        return None
+    return WORKSPACE_QUOTA_BYTES - workspace_usage(workspace)
+
+
+def workspace_quota_response():
+    return jsonify({'error': f'Workspace quota of {WORKSPACE_QUOTA_BYTES} bytes exceeded; clear it before fetching more'}), 507
+
+
+# Expire idle workspaces from a background thread in each worker process
+def start_workspace_sweeper():
+    global workspace_sweeper_pid
+    with workspace_sweeper_lock:
+        if workspace_sweeper_pid == os.getpid():
+            return
+        workspace_sweeper_pid = os.getpid()
+    threading.Thread(target=sweep_workspaces_forever, name='workspace-sweeper', daemon=True).start()
+
+
+def sweep_workspaces_forever():
+    while True:
+        time.sleep(WORKSPACE_SWEEP_INTERVAL)
+        try:
+            sweep_workspaces()
+        except Exception as e:
+            logger.error(f"Workspace sweep failed: {e}")
+
+
+def sweep_workspaces():
+    if not os.path.isdir(WORKSPACE_ROOT):
+        return
+    cutoff = time.time() - WORKSPACE_TTL_SECONDS
+    for name in os.listdir(WORKSPACE_ROOT):
+        workspace = os.path.join(WORKSPACE_ROOT, name)
+        if name.startswith('.') or not os.path.isdir(workspace):
+            continue
+        try:
+            last_used = os.path.getmtime(os.path.join(workspace, '.last_used'))
+        except OSError:
+            last_used = os.path.getmtime(workspace)
+        if last_used > cutoff or workspace_jobs(workspace):
+            continue
+
+        if tombstone(workspace):
+            logger.info(f"Removed idle workspace {name}")
+
+
+tombstone_reaper_pid = None
+tombstone_reaper_lock = threading.Lock()
+tombstone_added = threading.Event()
+
+
+# Rename a directory into the tombstone folder so it disappears at once; the reaper deletes it later.
+# Returns False when there was nothing to remove.
+def tombstone(path):
+    os.makedirs(TOMBSTONE_DIR, exist_ok=True)
+    try:
+        os.rename(path, os.path.join(TOMBSTONE_DIR, f"{uuid.uuid4().hex}-{os.path.basename(path)}"))
+    except FileNotFoundError:
+        return False
+    start_tombstone_reaper()
+    tombstone_added.set()
+    return True
+
+
+def start_tombstone_reaper():
+    global tombstone_reaper_pid
+    with tombstone_reaper_lock:
+        if tombstone_reaper_pid == os.getpid():
+            return
+        tombstone_reaper_pid = os.getpid()
+    threading.Thread(target=reap_tombstones_forever, name='tombstone-reaper', daemon=True).start()
+
+
+def reap_tombstones_forever():
+    # Lowest CPU priority for this thread; on Linux the I/O scheduler derives its priority from it too
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+    while True:
+        tombstone_added.wait(TOMBSTONE_REAP_INTERVAL)
+        tombstone_added.clear()
+        try:
+            reap_tombstones()
+        except Exception as e:
+            logger.error(f"Tombstone reaping failed: {e}")
+
+
+# Delete tombstones bottom-up, pausing between batches so clones and dumps keep their disk bandwidth.
+# Anything that fails is left in place and retried on the next pass.
+def reap_tombstones():
+    if not os.path.isdir(TOMBSTONE_DIR):
+        return
+    removed = 0
+    for name in os.listdir(TOMBSTONE_DIR):
+        path = os.path.join(TOMBSTONE_DIR, name)
+        failures = 0
+        if os.path.isdir(path) and not os.path.islink(path):
+            for root, dirs, files in os.walk(path, topdown=False):
+                for entry in files + dirs:
+                    entry_path = os.path.join(root, entry)
+                    try:
+                        if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+                            os.rmdir(entry_path)
+                        else:
+                            os.remove(entry_path)
+                    except OSError:
+                        failures += 1
+                    removed += 1
+                    if removed % TOMBSTONE_REAP_BATCH == 0:
+                        time.sleep(TOMBSTONE_REAP_PAUSE)
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                os.rmdir(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete tombstone {name} ({failures} entries failed), will retry: {e}")
+
+
+
+s3_clients = {}
+s3_clients_pid = None
+s3_clients_lock = threading.Lock()
+
+
+# Building a client costs tens of milliseconds of botocore setup, so each process keeps one per
+# region and signing mode. Clients are thread-safe and share their connection pool.
+def get_s3_client(region=None, signed=False):
+    global s3_clients_pid
+    with s3_clients_lock:
+        if s3_clients_pid != os.getpid():
+            s3_clients.clear()
+            s3_clients_pid = os.getpid()
+        client = s3_clients.get((region, signed))
+        if client is None:
+            Config = lazy_import('botocore.config').Config
+            if signed:
+                config = Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+            else:
+                config = Config(signature_version=lazy_import('botocore').UNSIGNED, max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+            client = lazy_import('boto3').client('s3', region_name=region, config=config)
+            s3_clients[(region, signed)] = client
+        return client
+
+
+# Ranged multipart GETs for large objects; chunk size is clamped to what S3 multipart allows
+def s3_transfer_config(concurrency=None, chunk_size=None):
+    concurrency = max(1, min(int(concurrency or S3_TRANSFER_CONCURRENCY), S3_MAX_POOL_CONNECTIONS))
+    chunk_size = max(5 * 1024 * 1024, min(int(chunk_size or S3_MULTIPART_CHUNK_BYTES), 1024 * 1024 * 1024))
+    return lazy_import('boto3.s3.transfer').TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=concurrency,
+        use_threads=concurrency > 1
+    )
+
+
+def aws_download_single_file(s3_url, local_file_path, size=None, region=None, signed=False, transfer_config=None, job=None):
+    # Parse the S3 URL to get the bucket name and object key
+    parsed_url = urlparse(s3_url)
     bucket_name = parsed_url.netloc
     object_key = parsed_url.path.lstrip('/')
 
-    # Create the S3 client with unsigned config for public access
-    s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED))
-    
+    s3 = get_s3_client(region, signed)
+    progress_lock = threading.Lock()
+    done = [0]
+
+    # Called from the transfer threads as each range lands on disk
+    def report_progress(bytes_transferred):
+        with progress_lock:
+            done[0] += bytes_transferred
+            bytes_done = done[0]
+        if job is not None:
+            job.check_cancelled()
+            job.update(bytes_done=bytes_done)
+
+    if job is not None:
+        job.update(objects_total=1, bytes_total=size)
     try:
         # Download the file
         print(f"Downloading {object_key} from bucket {bucket_name} to {local_file_path}")
-        s3.download_file(bucket_name, object_key, local_file_path)
+        s3.download_file(bucket_name, object_key, local_file_path, Config=transfer_config or s3_transfer_config(), Callback=report_progress)
         print(f"Download complete: {local_file_path}")
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"Error downloading file: {e}")
         raise Exception(f"Error downloading file: {e}")
+    if job is not None:
+        job.update(objects_done=1)
 
 
 @app.route('/aws-single-file', methods=['POST'])
@@ -138,53 +945,245 @@ def aws_single_file():
 
         if not s3_url:
             return jsonify({'error': 'S3 URL is required'}), 400
-        
+        parsed_url = urlparse(s3_url)
+        bucket_name = parsed_url.netloc
+        object_key = parsed_url.path.lstrip('/')
+        if not bucket_name or not object_key:
+            return jsonify({'error': 'S3 URL must include a bucket and an object key'}), 400
+
+        # Optional region, signing and transfer tuning for this download
+        region = data.get('region') or None
+        signed = bool(data.get('signed')) and S3_ALLOW_SIGNED
+        try:
+            transfer_config = s3_transfer_config(data.get('concurrency'), data.get('chunk_size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'concurrency and chunk_size must be integers'}), 400
+
         # Define the local file path where you want to save the file
-        cwd = os.getcwd()
-        local_file_path = os.path.join(cwd, 'aws_downloads', os.path.basename(urlparse(s3_url).path))
+        workspace = get_workspace()
+        size = get_s3_client(region, signed).head_object(Bucket=bucket_name, Key=object_key)['ContentLength']
+        remaining = workspace_remaining(workspace)
+        if remaining is not None and size > remaining:
+            return workspace_quota_response()
+        local_file_path = os.path.join(workspace, 'aws_downloads', os.path.basename(object_key))
 
         # Ensure the local folder exists
         os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-        
-        # Call the function to download the single file from S3
-        aws_download_single_file(s3_url, local_file_path)
 
-        return jsonify({'message': f'File downloaded successfully to {local_file_path}'}), 200
+        # Objects that fit in one part are fetched inline; larger ones download in the background
+        if size <= transfer_config.multipart_threshold:
+            aws_download_single_file(s3_url, local_file_path, size, region=region, signed=signed, transfer_config=transfer_config)
+            return jsonify({'message': f'File downloaded successfully to {local_file_path}'}), 200
+
+        def run_download(job):
+            aws_download_single_file(s3_url, local_file_path, size, region=region, signed=signed, transfer_config=transfer_config, job=job)
+            return {'message': f'File downloaded successfully to {local_file_path}', 'bytes': size}
+
+        job = submit_job('s3_download', run_download, workspace=workspace)
+        return job_accepted_response(job, 'Download started')
+    except lazy_import('botocore.exceptions').ClientError as e:
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 500
+        return jsonify({'error': f"Error downloading file: {e.response.get('Error', {}).get('Message') or e}"}), status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-# download all the contents from a bucket
-def dump_bucket(bucket_url, local_folder):
+# Dump manifests live next to the dump folder so they are never read as bucket files
+def dump_manifest_path(local_folder):
+    return f"{os.path.normpath(local_folder)}.manifest.json"
+
+
+def load_dump_manifest(local_folder):
+    try:
+        with open(dump_manifest_path(local_folder), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_dump_manifest(local_folder, manifest):
+    path = dump_manifest_path(local_folder)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+# Whether a listed object is already in the dump folder with the same size and ETag, so a resumed dump skips it
+def dump_object_downloaded(manifest, bucket_name, obj, local_file_path):
+    return (os.path.isfile(local_file_path) and os.path.getsize(local_file_path) == obj['Size']
+            and manifest.get(f"{bucket_name}/{obj['Key']}") == obj['ETag'])
+
+
+# Listing-time filters for a bucket dump; the bucket URL's path acts as a key prefix
+def parse_bucket_dump_filters(data, bucket_url):
+    include = data.get('include') or []
+    exclude = data.get('exclude') or []
+    if isinstance(include, str):
+        include = [pattern.strip() for pattern in include.split(',') if pattern.strip()]
+    if isinstance(exclude, str):
+        exclude = [pattern.strip() for pattern in exclude.split(',') if pattern.strip()]
+    if not isinstance(include, list) or not isinstance(exclude, list) or not all(isinstance(p, str) for p in include + exclude):
+        raise ValueError('include and exclude must be lists of glob patterns')
+
+    return {
+        'prefix': urlparse(bucket_url).path.lstrip('/') + (data.get('prefix') or ''),
+        'include': include,
+        'exclude': exclude,
+        'max_object_size': int(data['max_object_size']) if data.get('max_object_size') else None,
+        # Binary files are only ever listed by name when the dump is read, so they are skipped unless asked for
+        'include_binary': bool(data.get('include_binary'))
+    }
+
+
+# Why a listed object is left out of the dump, or None if it should be downloaded
+def bucket_object_skip_reason(key, size, filters):
+    if key.endswith('/'):
+        return 'folder'
+    extension = os.path.splitext(key)[1].lower()
+    if extension not in BUCKET_TEXT_EXTENSIONS and extension != '.pdf' and not (
+            filters['include_binary'] and extension in BUCKET_BINARY_EXTENSIONS):
+        return 'type'
+    if filters['include'] and not any(fnmatch.fnmatchcase(key, pattern) for pattern in filters['include']):
+        return 'include'
+    if any(fnmatch.fnmatchcase(key, pattern) for pattern in filters['exclude']):
+        return 'exclude'
+    if filters['max_object_size'] is not None and size > filters['max_object_size']:
+        return 'size'
+    return None
+
+
+# download the contents of a bucket that pass the filters
+# quota_bytes caps the bytes actually downloaded; objects a resumed dump skips are already on disk
+def dump_bucket(bucket_url, local_folder, max_objects=DUMP_MAX_OBJECTS, max_bytes=DUMP_MAX_BYTES, workers=DUMP_WORKERS, job=None, filters=None, quota_bytes=None):
     # Parse the S3 URL to get the bucket name
     parsed_url = urlparse(bucket_url)
     bucket_name = parsed_url.netloc
-
-    # Create the S3 client with unsigned config for public access
-    s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+    local_folder = os.path.abspath(local_folder)
+    filters = filters or parse_bucket_dump_filters({}, bucket_url)
+
+    # The process-wide client's connection pool is shared by every download worker
+    s3 = get_s3_client()
+    workers = min(workers, S3_MAX_POOL_CONNECTIONS)
+    # Objects are downloaded in parallel already, so each transfer stays single-threaded
+    transfer_config = lazy_import('boto3.s3.transfer').TransferConfig(use_threads=False)
+
+    manifest = load_dump_manifest(local_folder)
+    manifest_lock = threading.Lock()
+    last_flush = [time.monotonic()]
+    # Bound the number of listed-but-not-downloaded objects held in memory
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    summary = {'downloaded': 0, 'skipped': 0, 'filtered': 0, 'objects': 0, 'bytes': 0, 'truncated': False}
+    new_bytes = 0
+    done = {'objects': 0, 'bytes': 0}
+    failures = []
+
+    def report_done(size):
+        with manifest_lock:
+            done['objects'] += 1
+            done['bytes'] += size
+            objects_done, bytes_done = done['objects'], done['bytes']
+        if job is not None:
+            job.update(objects_done=objects_done, bytes_done=bytes_done)
+
+    def download(object_key, etag, size, local_file_path):
+        try:
+            if job is not None and job.is_cancelled():
+                return
+            os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+            print(f"Downloading {object_key} from bucket {bucket_name} to {local_file_path}")
+            s3.download_file(bucket_name, object_key, local_file_path, Config=transfer_config)
+            print(f"Download complete: {local_file_path}")
+            with manifest_lock:
+                manifest[f"{bucket_name}/{object_key}"] = etag
+                summary['downloaded'] += 1
+                # Flush periodically so a run killed by a timeout can resume
+                if time.monotonic() - last_flush[0] >= DUMP_MANIFEST_FLUSH_SECONDS:
+                    save_dump_manifest(local_folder, manifest)
+                    last_flush[0] = time.monotonic()
+            report_done(size)
+        except Exception as e:
+            print(f"Error downloading {object_key}: {e}")
+            failures.append((object_key, e))
+        finally:
+            in_flight.release()
 
     try:
-        # List all objects in the bucket
-        paginator = s3.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=bucket_name)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bucket-dump') as executor:
+            # List objects under the prefix, downloading while later pages are still being listed
+            paginator = s3.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=bucket_name, Prefix=filters['prefix'])
 
-        for page in pages:
-            if 'Contents' in page:
-                for obj in page['Contents']:
+            for page in pages:
+                for obj in page.get('Contents', []):
                     object_key = obj['Key']
-                    # Define the local file path where you want to save the file
-                    local_file_path = os.path.join(local_folder, object_key)
-
-                    # Ensure the local folder exists
-                    os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+                    size = obj['Size']
+                    if failures:
+                        break
+                    if job is not None:
+                        job.check_cancelled()
+                    # Filter on the listing so skipped objects never cross the network
+                    if bucket_object_skip_reason(object_key, size, filters) is not None:
+                        summary['filtered'] += 1
+                        continue
+
+                    # Define the local file path and refuse keys that escape the dump folder
+                    local_file_path = os.path.normpath(os.path.join(local_folder, object_key))
+                    if not local_file_path.startswith(local_folder + os.sep):
+                        print(f"Skipping unsafe object key: {object_key}")
+                        continue
+
+                    # Resume: skip objects already downloaded with the same size and ETag
+                    downloaded = dump_object_downloaded(manifest, bucket_name, obj, local_file_path)
+                    if ((max_objects and summary['objects'] >= max_objects) or (max_bytes and summary['bytes'] + size > max_bytes)
+                            or (quota_bytes is not None and not downloaded and new_bytes + size > quota_bytes)):
+                        summary['truncated'] = True
+                        break
+
+                    summary['objects'] += 1
+                    summary['bytes'] += size
+                    if downloaded:
+                        summary['skipped'] += 1
+                        report_done(size)
+                        continue
+
+                    new_bytes += size
+                    in_flight.acquire()
+                    executor.submit(download, object_key, obj['ETag'], size, local_file_path)
+
+                if summary['truncated'] or failures:
+                    break
 
-                    # Download the file
-                    print(f"Downloading {object_key} from bucket {bucket_name} to {local_file_path}")
-                    s3.download_file(bucket_name, object_key, local_file_path)
-                    print(f"Download complete: {local_file_path}")
+            # Listing is complete, so totals (and an ETA) are now known
+            if job is not None:
+                job.update(objects_total=summary['objects'], bytes_total=summary['bytes'])
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"Error dumping bucket: {e}")
         raise Exception(f"Error dumping bucket: {e}")
+    finally:
+        save_dump_manifest(local_folder, manifest)
+
+    if job is not None:
+        job.check_cancelled()
+
+    if failures:
+        object_key, error = failures[0]
+        raise Exception(f"Error dumping bucket: failed to download {object_key}: {error}")
+
+    return summary
+
+# Per-request object and byte caps, bounded by the server defaults
+def bucket_dump_limits(data):
+    max_objects = int(data.get('max_objects') or DUMP_MAX_OBJECTS)
+    max_bytes = int(data.get('max_bytes') or DUMP_MAX_BYTES)
+    if DUMP_MAX_OBJECTS:
+        max_objects = min(max_objects, DUMP_MAX_OBJECTS)
+    if DUMP_MAX_BYTES:
+        max_bytes = min(max_bytes, DUMP_MAX_BYTES)
+    return max_objects, max_bytes
+
 
 @app.route('/aws-bucket-dump', methods=['POST'])
 def aws_bucket_dump():
@@ -200,19 +1199,371 @@ def aws_bucket_dump():
             return jsonify({'error': 'Bucket URL is required'}), 400
 
         # Define the local folder where you want to save all files
-        cwd = os.getcwd()
-        local_folder = os.path.join(cwd, 'aws_bucket_dump')
+        workspace = get_workspace()
+        local_folder = os.path.join(workspace, 'aws_bucket_dump')
+        remaining = workspace_remaining(workspace)
+        if remaining is not None and remaining <= 0:
+            return workspace_quota_response()
+
+        # Optional filters, per-request caps and worker count
+        try:
+            filters = parse_bucket_dump_filters(data, bucket_url)
+            max_objects, max_bytes = bucket_dump_limits(data)
+            workers = max(1, min(int(data.get('workers') or DUMP_WORKERS), DUMP_WORKERS))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid dump options: {e}'}), 400
 
         # Ensure the local folder exists
         os.makedirs(local_folder, exist_ok=True)
 
-        # Dump the entire bucket
-        dump_bucket(bucket_url, local_folder)
+        # Dump the bucket in the background, resuming from any previous partial run
+        def run_dump(job):
+            summary = dump_bucket(bucket_url, local_folder, max_objects=max_objects, max_bytes=max_bytes, workers=workers,
+                                  job=job, filters=filters, quota_bytes=remaining)
+            message = f"Bucket contents downloaded successfully to {local_folder}"
+            if summary['truncated']:
+                message += ' (stopped at the configured object/size limit or the workspace quota)'
+            return {'message': message, 'summary': summary}
+
+        job = submit_job('bucket_dump', run_dump, workspace=workspace)
+        return job_accepted_response(job, 'Bucket dump started')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Dry run of /aws-bucket-dump: what the same request would download, without downloading anything
+@app.route('/aws-bucket-dump/manifest', methods=['POST'])
+def aws_bucket_dump_manifest():
+    if not is_premium_user():
+        return jsonify({'error': 'This feature is available to premium users only.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    bucket_url = data.get('bucket_url')
+    if not bucket_url:
+        return jsonify({'error': 'Bucket URL is required'}), 400
+
+    try:
+        filters = parse_bucket_dump_filters(data, bucket_url)
+        max_objects, max_bytes = bucket_dump_limits(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid dump options: {e}'}), 400
+
+    # Objects a resumed dump would skip are already on disk and do not count against the quota
+    workspace = get_workspace()
+    remaining = workspace_remaining(workspace)
+    local_folder = os.path.abspath(os.path.join(workspace, 'aws_bucket_dump'))
+    dump_manifest = load_dump_manifest(local_folder)
+    bucket_name = urlparse(bucket_url).netloc
+
+    manifest = {
+        'prefix': filters['prefix'],
+        'objects': 0,
+        'bytes': 0,
+        'new_bytes': 0,
+        'by_extension': {},
+        'skipped': {},
+        'sample': [],
+        'listed': 0,
+        'truncated': False,
+        'complete': True
+    }
+    try:
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=filters['prefix']):
+            for obj in page.get('Contents', []):
+                if manifest['listed'] >= DUMP_PREVIEW_MAX_LISTED:
+                    manifest['complete'] = False
+                    break
+                manifest['listed'] += 1
+
+                reason = bucket_object_skip_reason(obj['Key'], obj['Size'], filters)
+                local_file_path = os.path.normpath(os.path.join(local_folder, obj['Key']))
+                downloaded = dump_object_downloaded(dump_manifest, bucket_name, obj, local_file_path)
+                if reason is None and ((max_objects and manifest['objects'] >= max_objects) or
+                                       (max_bytes and manifest['bytes'] + obj['Size'] > max_bytes)):
+                    manifest['truncated'] = True
+                    reason = 'limit'
+                elif reason is None and remaining is not None and not downloaded and manifest['new_bytes'] + obj['Size'] > remaining:
+                    manifest['truncated'] = True
+                    reason = 'quota'
+                if reason is not None:
+                    skipped = manifest['skipped'].setdefault(reason, {'objects': 0, 'bytes': 0})
+                    skipped['objects'] += 1
+                    skipped['bytes'] += obj['Size']
+                    continue
 
-        return jsonify({'message': f'Bucket contents downloaded successfully to {local_folder}'}), 200
+                manifest['objects'] += 1
+                manifest['bytes'] += obj['Size']
+                if not downloaded:
+                    manifest['new_bytes'] += obj['Size']
+                extension = os.path.splitext(obj['Key'])[1].lower()
+                totals = manifest['by_extension'].setdefault(extension, {'objects': 0, 'bytes': 0})
+                totals['objects'] += 1
+                totals['bytes'] += obj['Size']
+                if len(manifest['sample']) < 100:
+                    manifest['sample'].append({'key': obj['Key'], 'size': obj['Size']})
+            if not manifest['complete']:
+                break
+    except lazy_import('botocore.exceptions').ClientError as e:
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 500
+        return jsonify({'error': f"Error listing bucket: {e.response.get('Error', {}).get('Message') or e}"}), status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    return jsonify(manifest), 200
+
+
+
+# Allowed file extensions for text files in a bucket dump
+BUCKET_TEXT_EXTENSIONS = (
+    '.txt', '.json', '.csv', '.xml', '.yaml', '.yml', '.md', '.ini', '.log',
+    '.html', '.css', '.scss', '.sass', '.less', '.py', '.js', '.ts',
+    '.jsx', '.tsx', '.cpp', '.c', '.h', '.java', '.rb', '.php', '.go',
+    '.swift', '.rs', '.kt', '.pl', '.lua', '.r', '.m', '.sh', '.bat'
+)
+
+# File extensions considered binary (handled separately)
+BUCKET_BINARY_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.zip', '.tar', '.gz')
+
+
+# Walk a bucket dump in a stable order, yielding supported files that pass the filters
+def iter_bucket_dump_files(local_folder, extensions=None, prefix=None, max_size=None):
+    for root, dirs, files in os.walk(local_folder):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            relative_path = os.path.relpath(file_path, local_folder).replace(os.sep, '/')
+            extension = os.path.splitext(file)[1].lower()
+
+            # Skip unsupported file types
+            if extension not in BUCKET_TEXT_EXTENSIONS and extension not in BUCKET_BINARY_EXTENSIONS and extension != '.pdf':
+                continue
+            if extensions and extension not in extensions:
+                continue
+            if prefix and not relative_path.startswith(prefix):
+                continue
+            if max_size is not None and os.path.getsize(file_path) > max_size:
+                continue
+            yield relative_path, file_path, extension
+
+
+# Build the response record for a single dumped file
+def read_bucket_dump_file(relative_path, file_path, extension):
+    file = os.path.basename(file_path)
+    if extension in BUCKET_BINARY_EXTENSIONS:
+        # Handle binary files (do not read the content, just indicate it's a binary file)
+        return {'filename': file, 'path': relative_path, 'content': 'Binary file - content not displayed', 'is_binary': True}
+
+    try:
+        if extension == '.pdf':
+            content = extract_pdf_text(file_path)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+    except Exception as e:
+        app.logger.error(f"Error reading file {file}: {str(e)}")
+        return {'filename': file, 'path': relative_path, 'content': '', 'is_binary': False, 'error': f"Failed to read {file}"}
+
+    return {'filename': file, 'path': relative_path, 'content': content, 'is_binary': False}
+
+
+extract_pool = None
+extract_pool_pid = None
+# Reentrant: cancelling a pool's futures runs their done callbacks, which take the lock too
+extract_pool_lock = threading.RLock()
+# Extraction processes report each task's start here, so a deadline runs from when the task started
+extract_start_queue = None
+# Submitted tasks that have not succeeded yet, by id
+extract_tasks = {}
+extract_task_ids = itertools.count()
+
+
+# Runs in each extraction process when it starts
+def init_extract_worker(start_queue):
+    global extract_start_queue
+    extract_start_queue = start_queue
+
+
+# Runs in an extraction process: report which process picked the task up, and when, then run it
+def run_extract_task(task_id, attempt, fn, args):
+    extract_start_queue.put((task_id, attempt, os.getpid(), time.time()))
+    return fn(*args)
+
+
+# Work submitted to the extraction pool. A task is rerun on a new pool when another task broke or
+# overran the old one; it is only failed for its own timeout, or when it was running during two crashes.
+class ExtractTask:
+    def __init__(self, fn, args):
+        self.id = next(extract_task_ids)
+        self.fn = fn
+        self.args = args
+        self.attempt = 0
+        self.crashes = 0
+        self.pool = None
+        self.future = None
+        self.pid = None
+        self.started_at = None
+        self.killed = False
+
+
+# Extraction processes come from a forkserver: forking a worker that is running request threads can
+# copy a lock some other thread holds and deadlock the child. The forkserver imports this module once,
+# so a rebuilt pool's processes start without importing it again. Callers hold extract_pool_lock.
+def get_extract_pool():
+    global extract_pool, extract_pool_pid, extract_start_queue
+    if extract_pool is None or extract_pool_pid != os.getpid():
+        if extract_pool_pid != os.getpid():
+            extract_tasks.clear()
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        # SimpleQueue writes straight to the pipe, so a report is not lost when the process dies right after
+        extract_start_queue = context.SimpleQueue()
+        extract_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS, mp_context=context,
+            initializer=init_extract_worker, initargs=(extract_start_queue,)
+        )
+        extract_pool_pid = os.getpid()
+    return extract_pool
+
+
+# Callers hold extract_pool_lock
+def submit_extract_task(task):
+    pool = get_extract_pool()
+    task.attempt += 1
+    task.pool = pool
+    task.pid = task.started_at = None
+    extract_tasks[task.id] = task
+    task.future = pool.submit(run_extract_task, task.id, task.attempt, task.fn, task.args)
+    task.future.add_done_callback(lambda future: forget_extract_task(task, future))
+
+
+def forget_extract_task(task, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    with extract_pool_lock:
+        if task.future is future:
+            extract_tasks.pop(task.id, None)
+
+
+def submit_extraction(fn, *args):
+    task = ExtractTask(fn, args)
+    with extract_pool_lock:
+        submit_extract_task(task)
+    return task
+
+
+# Record the start reports that have arrived; callers hold extract_pool_lock
+def note_extract_starts():
+    while True:
+        try:
+            if extract_start_queue.empty():
+                return
+            task_id, attempt, pid, started_at = extract_start_queue.get()
+        except (OSError, ValueError, EOFError):
+            return
+        task = extract_tasks.get(task_id)
+        if task is not None and task.attempt == attempt:
+            task.pid, task.started_at = pid, started_at
+
+
+# Retire a broken pool and rerun its unfinished tasks on a new one; callers hold extract_pool_lock.
+# crashed is False when the pool was broken on purpose to stop an overrunning task.
+def replace_extract_pool(pool, crashed=True):
+    global extract_pool
+    if extract_pool is not pool:
+        return
+    note_extract_starts()
+    extract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    for task in list(extract_tasks.values()):
+        if task.pool is not pool or task.killed:
+            continue
+        if task.future.done() and not task.future.cancelled() and task.future.exception() is None:
+            continue
+        if crashed and task.started_at is not None:
+            task.crashes += 1
+        if task.crashes >= 2 or task.attempt >= 5:
+            # Running both times the pool went down: most likely the cause (the attempt cap is a backstop)
+            extract_tasks.pop(task.id, None)
+            continue
+        submit_extract_task(task)
+
+
+# Wait for an extraction. A task running longer than EXTRACT_TIMEOUT has its process killed (a running
+# task cannot be cancelled); that breaks the pool, so the other unfinished tasks are rerun on a new one.
+def extraction_result(task):
+    try:
+        while True:
+            future = task.future
+            try:
+                return future.result(timeout=1)
+            except TimeoutError:
+                with extract_pool_lock:
+                    note_extract_starts()
+                    if task.future is not future or task.started_at is None:
+                        continue
+                    if time.time() - task.started_at <= EXTRACT_TIMEOUT:
+                        continue
+                    task.killed = True
+                    try:
+                        os.kill(task.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    replace_extract_pool(task.pool, crashed=False)
+                raise TimeoutError(f"Extraction ran longer than {EXTRACT_TIMEOUT:g}s")
+            except (BrokenProcessPool, CancelledError):
+                with extract_pool_lock:
+                    if task.future is future:
+                        replace_extract_pool(task.pool)
+                    if task.future is future:
+                        # Not rerun: this task was running during two crashes
+                        raise
+    finally:
+        with extract_pool_lock:
+            extract_tasks.pop(task.id, None)
+
+
+# Text from the extraction cache, or None if the PDF still has to be parsed
+def cached_pdf_text(file_path):
+    extraction = load_cached_extraction(file_content_hash(file_path))
+    return extraction['text'] if extraction is not None else None
+
+
+# Extract uncached PDFs on the process pool while yielding records in walk order
+def iter_bucket_dump_records(matches):
+    pending = deque()
+    for relative_path, file_path, extension in matches:
+        text = task = None
+        if extension == '.pdf':
+            try:
+                # A cache hit is used as-is so the entry is not loaded a second time
+                text = cached_pdf_text(file_path)
+                if text is None:
+                    task = submit_extraction(extract_pdf_text, file_path)
+            except OSError:
+                pass
+        pending.append((relative_path, file_path, extension, text, task))
+        # Keep a bounded window of files in flight so memory stays flat
+        if len(pending) >= EXTRACT_WORKERS * 2:
+            yield finish_bucket_dump_record(*pending.popleft())
+    while pending:
+        yield finish_bucket_dump_record(*pending.popleft())
+
+
+def finish_bucket_dump_record(relative_path, file_path, extension, text, task):
+    file = os.path.basename(file_path)
+    if text is not None:
+        return {'filename': file, 'path': relative_path, 'content': text, 'is_binary': False}
+    if task is None:
+        return read_bucket_dump_file(relative_path, file_path, extension)
+
+    try:
+        content = extraction_result(task)
+    except Exception as e:
+        # A corrupt or slow PDF only fails its own record
+        app.logger.error(f"Error reading PDF {file}: {str(e) or type(e).__name__}")
+        return {'filename': file, 'path': relative_path, 'content': '', 'is_binary': False, 'error': f"Failed to read {file}"}
+    return {'filename': file, 'path': relative_path, 'content': content, 'is_binary': False}
 
 
 @app.route('/read-bucket-dump', methods=['GET'])
@@ -222,102 +1573,412 @@ def read_bucket_dump():
         return jsonify({'error': 'This feature is available to premium users only.'}), 403
     
     # The local folder where the bucket contents were dumped
-    local_folder = os.path.join(os.getcwd(), 'aws_bucket_dump')
-    
-    # Allowed file extensions for text files
-    allowed_file_extensions = [
-        '.txt', '.json', '.csv', '.xml', '.yaml', '.yml', '.md', '.ini', '.log',
-        '.html', '.css', '.scss', '.sass', '.less', '.py', '.js', '.ts', 
-        '.jsx', '.tsx', '.cpp', '.c', '.h', '.java', '.rb', '.php', '.go', 
-        '.swift', '.rs', '.kt', '.pl', '.lua', '.r', '.m', '.sh', '.bat'
-    ]
-    
-    # File extensions considered binary (handled separately)
-    binary_file_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.zip', '.tar', '.gz']
-    
+    local_folder = os.path.join(get_workspace(), 'aws_bucket_dump')
+
+    if not os.path.exists(local_folder):
+        return jsonify({'error': 'No bucket dump found'}), 400
+
+    # Pagination and server-side filters
     try:
-        if not os.path.exists(local_folder):
-            return jsonify({'error': 'No bucket dump found'}), 400
-        
-        file_contents = []
-        
-        # Traverse through the dumped files in the local folder
-        for root, dirs, files in os.walk(local_folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                extension = os.path.splitext(file)[1].lower()
-                
-                if extension in allowed_file_extensions:
-                    # Handle text files
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        file_contents.append({
-                            'filename': file,
-                            'content': content,
-                            'is_binary': False
-                        })
-                    except Exception as e:
-                        app.logger.error(f"Error reading file {file}: {str(e)}")
-                        return jsonify({'error': f"Failed to read {file}"}), 500
-                elif extension == '.pdf':
-                    # Handle PDF files
-                    try:
-                        content = extract_pdf_text(file_path)
-                        file_contents.append({
-                            'filename': file,
-                            'content': content,
-                            'is_binary': False
-                        })
-                    except Exception as e:
-                        app.logger.error(f"Error reading PDF {file}: {str(e)}")
-                        return jsonify({'error': f"Failed to read {file}"}), 500
-                elif extension in binary_file_extensions:
-                    # Handle binary files (do not read the content, just indicate it's a binary file)
-                    file_contents.append({
-                        'filename': file,
-                        'content': 'Binary file - content not displayed',
-                        'is_binary': True
-                    })
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        max_size = int(request.args['max_size']) if request.args.get('max_size') else None
+    except ValueError:
+        return jsonify({'error': 'offset, limit and max_size must be integers'}), 400
+    if offset < 0 or any(value is not None and value < 0 for value in (limit, max_size)):
+        return jsonify({'error': 'offset, limit and max_size must not be negative'}), 400
+
+    extensions = None
+    if request.args.get('ext'):
+        extensions = {f".{ext.strip().lower().lstrip('.')}" for ext in request.args['ext'].split(',') if ext.strip()}
+    prefix = request.args.get('prefix')
+    ndjson = request.args.get('format') == 'ndjson'
+
+    # Files are read and sent one at a time so memory stays flat for large dumps
+    def generate():
+        sent = 0
+        next_offset = None
+        error = None
+        if not ndjson:
+            yield '{"files": ['
+        try:
+            matches = iter_bucket_dump_files(local_folder, extensions=extensions, prefix=prefix, max_size=max_size)
+            page = itertools.islice(matches, offset, None if limit is None else offset + limit)
+            for record in iter_bucket_dump_records(page):
+                record = json.dumps(record)
+                if ndjson:
+                    yield record + '\n'
                 else:
-                    # Skip unsupported file types
-                    continue
+                    yield record if sent == 0 else ',' + record
+                sent += 1
+            # Anything left after the page means there is another page
+            if limit is not None and next(matches, None) is not None:
+                next_offset = offset + limit
+        except Exception as e:
+            app.logger.error(f"Error reading bucket dump: {str(e)}")
+            error = str(e)
+
+        trailer = {'next_offset': next_offset}
+        if error:
+            trailer['error'] = error
+        if ndjson:
+            yield json.dumps(dict(trailer, done=True)) + '\n'
+        else:
+            yield '], ' + json.dumps(trailer)[1:]
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return app.response_class(generate(), mimetype=mimetype), 200
 
-        return jsonify({'files': file_contents}), 200
+bucket_stream_executor = ThreadPoolExecutor(max_workers=BUCKET_STREAM_WORKERS, thread_name_prefix='bucket-stream')
 
+
+# List a bucket in key order, filtering by extension and size before anything is downloaded
+def iter_bucket_objects(s3, bucket_name, key_prefix, extensions=None, max_size=None, start_after=None):
+    params = {'Bucket': bucket_name, 'Prefix': key_prefix}
+    if start_after:
+        params['StartAfter'] = start_after
+    for page in s3.get_paginator('list_objects_v2').paginate(**params):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            extension = os.path.splitext(key)[1].lower()
+
+            # Skip folder markers and unsupported file types
+            if key.endswith('/'):
+                continue
+            if extension not in BUCKET_TEXT_EXTENSIONS and extension not in BUCKET_BINARY_EXTENSIONS and extension != '.pdf':
+                continue
+            if extensions and extension not in extensions:
+                continue
+            if max_size is not None and obj['Size'] > max_size:
+                continue
+            yield key, extension
+
+
+# Build the response record for one object straight from its response body; nothing touches disk
+# unless caching is requested, in which case PDF extractions go to the extraction cache
+def read_bucket_object(s3, bucket_name, key, extension, cache=False):
+    file = os.path.basename(key)
+    if extension in BUCKET_BINARY_EXTENSIONS:
+        # Binary objects are never downloaded
+        return {'filename': file, 'path': key, 'content': 'Binary file - content not displayed', 'is_binary': True}
+
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body']
+        try:
+            data = body.read()
+        finally:
+            body.close()
+
+        if extension == '.pdf':
+            content = extract_pdf_bytes(data, cache=cache)['text']
+        else:
+            content = decode_file_bytes(data)[0]
     except Exception as e:
-        app.logger.error(f"Error reading bucket dump: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        app.logger.error(f"Error reading object {key}: {str(e) or type(e).__name__}")
+        return {'filename': file, 'path': key, 'content': '', 'is_binary': False, 'error': f"Failed to read {file}"}
+
+    return {'filename': file, 'path': key, 'content': content, 'is_binary': False}
+
+
+# Fetch objects concurrently while yielding records in key order
+def iter_bucket_object_records(s3, bucket_name, objects, cache=False):
+    pending = deque()
+    try:
+        for key, extension in objects:
+            pending.append(bucket_stream_executor.submit(read_bucket_object, s3, bucket_name, key, extension, cache))
+            # Keep a bounded window of objects in flight so memory stays flat
+            if len(pending) >= BUCKET_STREAM_WORKERS * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# Stream bucket contents into a pack without dumping them to the workspace first
+@app.route('/aws-bucket-stream', methods=['GET'])
+def aws_bucket_stream():
+    if not is_premium_user():
+        return jsonify({'error': 'This feature is available to premium users only.'}), 403
+
+    bucket_url = request.args.get('bucket_url')
+    if not bucket_url:
+        return jsonify({'error': 'Bucket URL is required'}), 400
+    parsed_url = urlparse(bucket_url)
+    bucket_name = parsed_url.netloc
+    key_prefix = parsed_url.path.lstrip('/') + request.args.get('prefix', '')
+
+    # Key-ordered pagination and server-side filters
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        max_size = min(int(request.args.get('max_size') or BUCKET_STREAM_MAX_OBJECT_BYTES), BUCKET_STREAM_MAX_OBJECT_BYTES)
+    except ValueError:
+        return jsonify({'error': 'limit and max_size must be integers'}), 400
+    if (limit is not None and limit < 0) or max_size < 0:
+        return jsonify({'error': 'limit and max_size must not be negative'}), 400
+
+    extensions = None
+    if request.args.get('ext'):
+        extensions = {f".{ext.strip().lower().lstrip('.')}" for ext in request.args['ext'].split(',') if ext.strip()}
+    start_after = request.args.get('start_after')
+    cache = request.args.get('cache', '').lower() in ('1', 'true', 'yes')
+    ndjson = request.args.get('format') == 'ndjson'
+    s3 = get_s3_client(request.args.get('region') or None, request.args.get('signed') == 'true' and S3_ALLOW_SIGNED)
+
+    def generate():
+        sent = 0
+        last_key = None
+        next_start_after = None
+        error = None
+        if not ndjson:
+            yield '{"files": ['
+        try:
+            objects = iter_bucket_objects(s3, bucket_name, key_prefix, extensions=extensions, max_size=max_size, start_after=start_after)
+            page = itertools.islice(objects, limit)
+            for record in iter_bucket_object_records(s3, bucket_name, page, cache=cache):
+                last_key = record['path']
+                record = json.dumps(record)
+                if ndjson:
+                    yield record + '\n'
+                else:
+                    yield record if sent == 0 else ',' + record
+                sent += 1
+            # Anything left after the page means there is another page
+            if limit is not None and next(objects, None) is not None:
+                next_start_after = last_key
+        except Exception as e:
+            app.logger.error(f"Error streaming bucket {bucket_name}: {str(e)}")
+            error = str(e)
+
+        trailer = {'next_start_after': next_start_after}
+        if error:
+            trailer['error'] = error
+        if ndjson:
+            yield json.dumps(dict(trailer, done=True)) + '\n'
+        else:
+            yield '], ' + json.dumps(trailer)[1:]
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return app.response_class(generate(), mimetype=mimetype), 200
+
+
+# Maps (path, mtime, size) to a content hash so unchanged files are not re-hashed
+extract_hash_index = TTLCache(65536, 24 * 60 * 60)
+extract_cache_lock = threading.Lock()
+extract_cache_bytes = None
+
+
+def file_content_hash(file_path):
+    stat = os.stat(file_path)
+    index_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    content_hash = extract_hash_index.get(index_key)
+    if content_hash is None:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        extract_hash_index.set(index_key, content_hash)
+    return content_hash
+
+
+def extract_cache_path(content_hash):
+    return os.path.join(EXTRACT_CACHE_DIR, content_hash[:2], f"{content_hash}.json")
+
+
+def load_cached_extraction(content_hash):
+    path = extract_cache_path(content_hash)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            extraction = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Touch the entry so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return extraction
+
+
+def store_cached_extraction(content_hash, extraction):
+    global extract_cache_bytes
+    path = extract_cache_path(content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(extraction, f)
+    os.replace(tmp_path, path)
+
+    with extract_cache_lock:
+        if extract_cache_bytes is None:
+            extract_cache_bytes = evict_extract_cache()
+        else:
+            extract_cache_bytes += os.path.getsize(path)
+            if extract_cache_bytes > EXTRACT_CACHE_MAX_BYTES:
+                extract_cache_bytes = evict_extract_cache()
+
+
+# Drop least recently used entries until the cache is back under its byte budget
+def evict_extract_cache():
+    entries = []
+    for root, dirs, files in os.walk(EXTRACT_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= EXTRACT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+    return total
+
+
+# Text of every page, with the offset where each page starts
+def read_pdf_pages(pdf_file):
+    pages = []
+    page_offsets = []
+    offset = 0
+    reader = lazy_import('PyPDF2').PdfReader(pdf_file)
+    # Extract text from each page
+    for page in reader.pages:
+        page_text = page.extract_text() or ''
+        page_offsets.append(offset)
+        pages.append(page_text)
+        offset += len(page_text)
+    return {'text': ''.join(pages), 'page_offsets': page_offsets}
+
+
+# In-memory variant for objects streamed from S3; runs in the extraction pool
+def extract_pdf_data(data):
+    return read_pdf_pages(io.BytesIO(data))
+
+
+# Extraction of PDF bytes held in memory, run on the extraction pool and looked up in the cache first
+def extract_pdf_bytes(data, cache=True):
+    content_hash = hashlib.sha256(data).hexdigest()
+    extraction = load_cached_extraction(content_hash)
+    if extraction is None:
+        extraction = extraction_result(submit_extraction(extract_pdf_data, data))
+        if cache:
+            store_cached_extraction(content_hash, extraction)
+    return extraction
+
+
+# Text of an uploaded PDF; decoding its bytes as text would only produce mojibake
+def extract_upload_pdf_text(file):
+    file.stream.seek(0)
+    return extract_pdf_bytes(file.stream.read())['text']
+
+
+def extract_pdf(file_path):
+    content_hash = file_content_hash(file_path)
+    extraction = load_cached_extraction(content_hash)
+    if extraction is not None:
+        return extraction
+
+    with open(file_path, 'rb') as pdf_file:
+        extraction = read_pdf_pages(pdf_file)
+    try:
+        store_cached_extraction(content_hash, extraction)
+    except OSError as e:
+        logger.warning(f"Could not cache extracted text for {file_path}: {e}")
+    return extraction
+
 
 # Helper function to extract text from PDFs using PyPDF2
 def extract_pdf_text(file_path):
-    pdf_text = ""
-    with open(file_path, 'rb') as pdf_file:
-        reader = PyPDF2.PdfReader(pdf_file)
-        # Extract text from each page
-        for page_num in range(len(reader.pages)):
-            page = reader.pages[page_num]
-            pdf_text += page.extract_text()
-    return pdf_text
+    return extract_pdf(file_path)['text']
+
+
+
+# Size of an uploaded file without reading it into memory (werkzeug spools large uploads to disk)
+def upload_size(file):
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
+    return size
+
+
+# Decode an uploaded file in fixed-size chunks, yielding text as it is decoded
+def iter_decoded_upload(file, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    file.stream.seek(0)
+    for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+# NUL bytes near the start mark binary content (as in index_repo_file), unless a UTF-16/32 BOM explains them.
+# The latin-1 fallback below would otherwise "decode" any binary upload.
+def upload_is_binary(file):
+    file.stream.seek(0)
+    head = file.stream.read(8192)
+    file.stream.seek(0)
+    if any(head.startswith(bom) for bom, _ in FILE_ENCODING_BOMS):
+        return False
+    return b'\0' in head
 
 
+# Same detection order as decode_file_bytes, validated with a streaming pass that keeps no text
+def detect_upload_encoding(file):
+    file.stream.seek(0)
+    head = file.stream.read(4)
+    for bom, encoding in FILE_ENCODING_BOMS:
+        if head.startswith(bom):
+            return encoding
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            for _ in iter_decoded_upload(file, encoding):
+                pass
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
 
-@app.route('/read-files', methods=['POST'])
-def read_files():
-    allowed_file_extensions = [
+
+# JSON string literal for streamed text, emitted piece by piece
+def iter_json_string(pieces):
+    yield '"'
+    for piece in pieces:
+        yield json.dumps(piece)[1:-1]
+    yield '"'
+
+
+# File types accepted for code packs
+CODE_FILE_EXTENSIONS = [
     # Text and Data Files
     '.txt', '.json', '.csv', '.xml', '.yaml', '.yml', '.md', '.ini', '.log', '.pdf',
-    
+
     # Web and Style Files
     '.html', '.css', '.scss', '.sass', '.less',
-    
+
     # Programming and Scripting Languages
-    '.py', '.js', '.ts', '.jsx', '.tsx', '.cpp', '.c', '.h', '.java', '.rb', 
-    '.php', '.go', '.swift', '.rs', '.kt', '.pl', '.lua', '.r', '.m', 
-    
+    '.py', '.js', '.ts', '.jsx', '.tsx', '.cpp', '.c', '.h', '.java', '.rb',
+    '.php', '.go', '.swift', '.rs', '.kt', '.pl', '.lua', '.r', '.m',
+
     # Shell/Bash and Batch Files
     '.sh', '.bat'
-    ]
+]
+
+
+@app.route('/read-files', methods=['POST'])
+def read_files():
+    allowed_file_extensions = CODE_FILE_EXTENSIONS
 
     try:
         # Log the start of the function
@@ -335,19 +1996,15 @@ def read_files():
         app.logger.info(f"Received {len(files)} files.")
         print(f"Received {len(files)} files.")
 
-        # List to store the processed file contents
-        file_contents = []
-
         if not files:
             app.logger.error("Empty file list in the request.")
             print("Empty file list in the request.")
             return jsonify({"error": "No files provided"}), 400
 
-        # Iterate over the files
+        # Check extensions and sizes up front, before anything is decoded
+        accepted_files = []
         for file in files:
             filename = file.filename
-            app.logger.info(f"Processing file: {filename}")
-            print(f"Processing file: {filename}")
 
             # Check if the file extension is allowed
             if not filename.endswith(tuple(allowed_file_extensions)):
@@ -355,26 +2012,47 @@ def read_files():
                 print(f"Skipping unsupported file: {filename}")
                 continue
 
-            try:
-                # Read the content as text (assuming UTF-8 encoding)
-                content = file.read().decode('utf-8')
-                file_contents.append({
-                    'filename': filename,
-                    'content': content
-                })
+            if upload_size(file) > UPLOAD_MAX_FILE_BYTES:
+                app.logger.error(f"File too large: {filename}")
+                return jsonify({"error": f"{filename} is larger than {UPLOAD_MAX_FILE_BYTES} bytes"}), 413
+            accepted_files.append(file)
+
+        # Stream the JSON array so no file is ever held in memory as a whole string
+        def generate():
+            yield '['
+            for position, file in enumerate(accepted_files):
+                filename = file.filename
+                app.logger.info(f"Processing file: {filename}")
+                print(f"Processing file: {filename}")
+
+                prefix = ('' if position == 0 else ',') + '{"filename": ' + json.dumps(filename)
+                if filename.lower().endswith('.pdf'):
+                    try:
+                        text = extract_upload_pdf_text(file)
+                    except Exception as e:
+                        app.logger.error(f"Error extracting text from {filename}: {str(e) or type(e).__name__}")
+                        yield prefix + ', "content": "", "error": ' + json.dumps(f"Failed to read {filename}") + '}'
+                        continue
+                    yield prefix + ', "content": ' + json.dumps(text) + '}'
+                elif upload_is_binary(file):
+                    app.logger.warning(f"Skipping binary content in {filename}")
+                    yield prefix + ', "content": "", "error": ' + json.dumps(f"{filename} is not a text file") + '}'
+                    continue
+                else:
+                    encoding = detect_upload_encoding(file)
+                    yield prefix + ', "content": '
+                    yield from iter_json_string(iter_decoded_upload(file, encoding))
+                    yield '}'
+
                 app.logger.info(f"Successfully processed file: {filename}")
                 print(f"Successfully processed file: {filename}")
 
-            except Exception as e:
-                app.logger.error(f"Error processing file {filename}: {str(e)}")
-                print(f"Error processing file {filename}: {str(e)}")
-                return jsonify({"error": f"Failed to process {filename}"}), 500
-
-        # Log the total number of successfully processed files
-        app.logger.info(f"Successfully processed {len(file_contents)} files out of {len(files)}.")
-        print(f"Successfully processed {len(file_contents)} files out of {len(files)}.")
+            # Log the total number of successfully processed files
+            app.logger.info(f"Successfully processed {len(accepted_files)} files out of {len(files)}.")
+            print(f"Successfully processed {len(accepted_files)} files out of {len(files)}.")
+            yield ']'
 
-        return jsonify(file_contents), 200
+        return app.response_class(stream_with_context(generate()), mimetype='application/json'), 200
 
     except Exception as e:
         # Log the error in case of an exception
@@ -384,30 +2062,132 @@ def read_files():
 
 
 
+# Recently read repository files, keyed by (path, mtime, size)
+repo_file_cache = TTLCache(256, 300)
+
+
+# Absolute path of a repository file, or None if it would escape the repository
+def resolve_repo_path(repo_directory, filename):
+    root = os.path.realpath(repo_directory)
+    file_path = os.path.realpath(os.path.join(root, filename or ''))
+    if not file_path.startswith(root + os.sep):
+        return None
+    return file_path
+
+
+# Byte order marks checked before falling back to UTF-8 and then Windows-1252
+FILE_ENCODING_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+)
+
+
+# Detect the encoding from a BOM, else try UTF-8, then Windows-1252, then Latin-1 (never fails)
+def decode_file_bytes(data):
+    for bom, encoding in FILE_ENCODING_BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding), encoding
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            continue
+    return data.decode('latin-1'), 'latin-1'
+
+
+def read_repo_file(file_path, max_bytes=REPO_FILE_MAX_BYTES):
+    stat = os.stat(file_path)
+    if stat.st_size > max_bytes:
+        raise ValueError(f"File is larger than {max_bytes} bytes")
+
+    cache_key = (file_path, stat.st_mtime_ns, stat.st_size)
+    cached = repo_file_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    with open(file_path, 'rb') as f:
+        content = decode_file_bytes(f.read())
+    if stat.st_size <= REPO_FILE_CACHE_ENTRY_MAX_BYTES:
+        repo_file_cache.set(cache_key, content)
+    return content
+
+
 @app.route('/get-repo-file-content', methods=['GET'])
 def get_repo_file_content():
     filename = request.args.get('filename')
-    repo_directory = 'repofetch'  # Directory where the repo was cloned
+    repo_directory = os.path.join(get_workspace(), 'repofetch')  # Directory where the repo was cloned
 
     # Check if the file exists
-    file_path = os.path.join(repo_directory, filename)
+    file_path = resolve_repo_path(repo_directory, filename)
     
-    if not os.path.exists(file_path):
+    if file_path is None or not os.path.isfile(file_path):
         app.logger.error(f"File not found: {filename}")
         return jsonify({"error": "File not found"}), 404
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        content, encoding = read_repo_file(file_path)
 
         app.logger.info(f"Successfully fetched content for file: {filename}")
-        return jsonify({"filename": filename, "content": content}), 200
+        return jsonify({"filename": filename, "content": content, "encoding": encoding}), 200
 
     except Exception as e:
         app.logger.error(f"Error reading file {filename}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+# Stream the contents of many repository files in one NDJSON response
+@app.route('/get-repo-file-contents', methods=['POST'])
+def get_repo_file_contents():
+    repo_directory = os.path.join(get_workspace(), 'repofetch')  # Directory where the repo was cloned
+    data = request.get_json(silent=True) or {}
+
+    paths = data.get('paths')
+    pattern = data.get('glob')
+    prefix = data.get('prefix')
+    if not paths and not pattern and not prefix:
+        return jsonify({"error": "paths, glob or prefix is required"}), 400
+    if paths is not None and not (isinstance(paths, list) and all(isinstance(path, str) for path in paths)):
+        return jsonify({"error": "paths must be a list of strings"}), 400
+    if any(value is not None and not isinstance(value, str) for value in (pattern, prefix)):
+        return jsonify({"error": "glob and prefix must be strings"}), 400
+
+    try:
+        max_bytes = min(int(data.get('max_file_size') or REPO_FILE_MAX_BYTES), REPO_FILE_MAX_BYTES)
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_file_size must be an integer"}), 400
+
+    # Glob and prefix selections are resolved against the repository index, skipping binary files
+    if not paths:
+        index = get_repo_index(repo_directory)
+        paths = [
+            path for path in index['paths']
+            if not index['entries'][path]['is_binary']
+            and (not prefix or path.startswith(prefix))
+            and (not pattern or fnmatch.fnmatch(path, pattern))
+        ]
+
+    def generate():
+        for filename in paths:
+            file_path = resolve_repo_path(repo_directory, filename)
+            if file_path is None or not os.path.isfile(file_path):
+                record = {"filename": filename, "error": "File not found"}
+            else:
+                try:
+                    content, encoding = read_repo_file(file_path, max_bytes)
+                    record = {"filename": filename, "content": content, "encoding": encoding}
+                except Exception as e:
+                    app.logger.error(f"Error reading file {filename}: {str(e)}")
+                    record = {"filename": filename, "error": str(e)}
+            yield json.dumps(record) + '\n'
+        yield json.dumps({"done": True}) + '\n'
+
+    return app.response_class(generate(), mimetype='application/x-ndjson'), 200
+
+
+
 
 
 @app.before_request
@@ -418,33 +2198,68 @@ def before_request():
 
 
 
-@app.route('/')
-def home():
-    packs = []
-    code_packs = []  # Initialize an empty list for code packs
-    if 'access_token' in session:
-        token = session.get('access_token')
-        headers = {'Authorization': f'Bearer {token}'}
+# Upstream listing endpoints that make up a user's pack catalog
+PACK_LISTINGS = {
+    'packs': ('/packman/list_packs', 'packs'),
+    'code_packs': ('/packman/code/list_code_packs', 'code packs')
+}
+
+
+# Fetch regular and code pack listings concurrently and cache the combined result
+def get_pack_catalog(token):
+    cache_key = token_cache_key(token)
+    catalog = pack_cache.get(cache_key)
+    if catalog is not None:
+        return catalog
+
+    headers = {'Authorization': f'Bearer {token}'}
+    futures = {
+        name: pack_fetch_executor.submit(api_get, path, headers=headers)
+        for name, (path, _) in PACK_LISTINGS.items()
+    }
+
+    catalog = {'packs': [], 'code_packs': [], 'errors': {}}
+    for name, future in futures.items():
         try:
-            # Fetch regular packs
-            response = requests.get(f"{API_URL}/packman/list_packs", headers=headers)
+            response = future.result()
             if response.status_code == 200:
-                packs = response.json()
+                catalog[name] = response.json()
             else:
-                logger.error(f"Failed to fetch packs: {response.text}")
-                flash('Failed to fetch packs', 'danger')
+                catalog['errors'][name] = {'kind': 'failed', 'detail': response.text}
+        except requests.RequestException as e:
+            catalog['errors'][name] = {'kind': 'error', 'detail': str(e)}
 
-            # Fetch code packs
-            response = requests.get(f"{API_URL}/packman/code/list_code_packs", headers=headers)
-            if response.status_code == 200:
-                code_packs = response.json()
-            else:
-                logger.error(f"Failed to fetch code packs: {response.text}")
-                flash('Failed to fetch code packs', 'danger')
+    # Only complete listings are cached so failures are retried on the next view
+    if not catalog['errors']:
+        pack_cache.set(cache_key, catalog)
+    return catalog
 
-        except requests.RequestException as e:
-            logger.error(f"Error fetching packs: {e}")
-            flash('Error fetching packs', 'danger')
+
+def invalidate_pack_catalog(token):
+    if token:
+        pack_cache.pop(token_cache_key(token))
+
+
+def flash_pack_catalog_errors(catalog):
+    for name, error in catalog['errors'].items():
+        label = PACK_LISTINGS[name][1]
+        if error['kind'] == 'failed':
+            logger.error(f"Failed to fetch {label}: {error['detail']}")
+            flash(f'Failed to fetch {label}', 'danger')
+        else:
+            logger.error(f"Error fetching {label}: {error['detail']}")
+            flash(f'Error fetching {label}', 'danger')
+
+
+@app.route('/')
+def home():
+    packs = []
+    code_packs = []  # Initialize an empty list for code packs
+    if 'access_token' in session:
+        catalog = get_pack_catalog(session.get('access_token'))
+        flash_pack_catalog_errors(catalog)
+        packs = catalog['packs']
+        code_packs = catalog['code_packs']
     return render_template('home.html', packs=packs, code_packs=code_packs)
 
 
@@ -454,21 +2269,156 @@ def packman_code():
     return render_template('packman_code.html')
     
 
-#leaves out .git files and directories
-def get_files_in_repofetch():
-    directory_path = 'repofetch'
-    if os.path.exists(directory_path) and os.path.isdir(directory_path):
-        # Skip .git directory and any other directories
-        return [f for f in os.listdir(directory_path) if f != '.git' and not os.path.isdir(os.path.join(directory_path, f))]
-    return []
+# In-memory copies of on-disk repository indexes, keyed by directory
+repo_indexes = {}
+repo_indexes_lock = threading.Lock()
+
+
+# Directory patterns from the repository's top-level .gitignore
+def gitignored_dir_patterns(directory):
+    patterns = []
+    try:
+        with open(os.path.join(directory, '.gitignore'), 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith(('#', '!')):
+                    patterns.append(line.strip('/'))
+    except OSError:
+        pass
+    return patterns
+
+
+# Size, extension, binary guess and content hash for one file
+def index_repo_file(directory, relative_path):
+    file_path = os.path.join(directory, relative_path)
+    digest = hashlib.sha256()
+    is_binary = False
+    with open(file_path, 'rb') as f:
+        first_chunk = f.read(8192)
+        is_binary = b'\0' in first_chunk
+        digest.update(first_chunk)
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return {
+        'path': relative_path,
+        'size': os.path.getsize(file_path),
+        'extension': os.path.splitext(relative_path)[1].lower(),
+        'is_binary': is_binary,
+        'hash': digest.hexdigest()
+    }
+
+
+# Recursive walk that skips VCS, vendored and ignored directories
+def build_repo_index(directory):
+    ignored = gitignored_dir_patterns(directory)
+    entries = {}
+    for root, dirs, files in os.walk(directory):
+        relative_root = os.path.relpath(root, directory)
+        relative_root = '' if relative_root == '.' else relative_root.replace(os.sep, '/') + '/'
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in REPO_INDEX_PRUNED_DIRS
+            and not any(fnmatch.fnmatch(d, pattern) or fnmatch.fnmatch(relative_root + d, pattern) for pattern in ignored)
+        )
+        for file in files:
+            if file == REPO_INDEX_FILENAME:
+                continue
+            relative_path = relative_root + file
+            try:
+                entries[relative_path] = index_repo_file(directory, relative_path)
+            except OSError as e:
+                logging.warning(f"Could not index '{relative_path}': {e}")
+    return save_repo_index(directory, entries)
+
+
+def save_repo_index(directory, entries):
+    index_path = os.path.join(directory, REPO_INDEX_FILENAME)
+    tmp_path = f"{index_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, index_path)
+
+    index = {'entries': entries, 'paths': sorted(entries), 'mtime': os.stat(index_path).st_mtime_ns}
+    with repo_indexes_lock:
+        repo_indexes[os.path.abspath(directory)] = index
+    return index
+
+
+# Current index for a directory: memory if still in sync with disk, else disk, else a fresh walk
+def get_repo_index(directory):
+    if not os.path.isdir(directory):
+        return {'entries': {}, 'paths': [], 'mtime': None}
+
+    index_path = os.path.join(directory, REPO_INDEX_FILENAME)
+    try:
+        mtime = os.stat(index_path).st_mtime_ns
+    except OSError:
+        return build_repo_index(directory)
+
+    with repo_indexes_lock:
+        index = repo_indexes.get(os.path.abspath(directory))
+    if index is not None and index['mtime'] == mtime:
+        return index
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return build_repo_index(directory)
+    index = {'entries': entries, 'paths': sorted(entries), 'mtime': mtime}
+    with repo_indexes_lock:
+        repo_indexes[os.path.abspath(directory)] = index
+    return index
+
+
+# Re-index only the given files (e.g. after an upload)
+def update_repo_index(directory, relative_paths):
+    entries = dict(get_repo_index(directory)['entries'])
+    for relative_path in relative_paths:
+        try:
+            entries[relative_path] = index_repo_file(directory, relative_path)
+        except OSError:
+            entries.pop(relative_path, None)
+    return save_repo_index(directory, entries)
+
+
+def repo_index_page(index, offset=0, limit=REPO_INDEX_PAGE_SIZE):
+    paths = index['paths'][offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(index['paths']) else None
+    return {
+        "files": paths,
+        "entries": [index['entries'][path] for path in paths],
+        "total": len(index['paths']),
+        "next_offset": next_offset
+    }
+
+
+#leaves out .git, vendored and ignored directories
+def get_files_in_repofetch(repo_directory, offset=0, limit=REPO_INDEX_PAGE_SIZE):
+    return repo_index_page(get_repo_index(repo_directory), offset, limit)
+
+
+@app.route('/repo-index', methods=['GET'])
+def repo_index():
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', REPO_INDEX_PAGE_SIZE)), 1), REPO_INDEX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    return jsonify(get_files_in_repofetch(os.path.join(get_workspace(), 'repofetch'), offset, limit)), 200
 
 # upload file
 @app.route('/upload-file', methods=['POST'])
 def upload_file():
     try:
-        directory_path = 'repofetch'
+        workspace = get_workspace()
+        directory_path = os.path.join(workspace, 'repofetch')
         logging.debug('Entered upload_file function')
 
+        remaining = workspace_remaining(workspace)
+        if remaining is not None and (request.content_length or 0) > remaining:
+            return workspace_quota_response()
+
         if not os.path.exists(directory_path):
             os.makedirs(directory_path)
             logging.debug(f"Directory 'repofetch' created at: {directory_path}")
@@ -488,25 +2438,154 @@ def upload_file():
         file.save(file_path)
         logging.debug(f"File '{filename}' uploaded to '{file_path}'")
 
-        files = get_files_in_repofetch()
-        return jsonify({"message": f"File '{filename}' successfully uploaded", "files": files}), 200
+        page = repo_index_page(update_repo_index(directory_path, [filename]))
+        return jsonify(dict(page, message=f"File '{filename}' successfully uploaded")), 200
 
     except Exception as e:
         logging.error(f"Server Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+clone_progress_class = None
+
+
+# Reports git clone progress to the owning job. The class subclasses GitPython's RemoteProgress,
+# so it is only defined once git is first needed.
+def clone_progress(job):
+    global clone_progress_class
+    if clone_progress_class is None:
+        RemoteProgress = lazy_import('git').RemoteProgress
+
+        class CloneProgress(RemoteProgress):
+            STAGES = {
+                RemoteProgress.COUNTING: 'counting',
+                RemoteProgress.COMPRESSING: 'compressing',
+                RemoteProgress.RECEIVING: 'receiving',
+                RemoteProgress.RESOLVING: 'resolving',
+                RemoteProgress.CHECKING_OUT: 'checking out'
+            }
+
+            def __init__(self, job):
+                super().__init__()
+                self.job = job
+
+            def update(self, op_code, cur_count, max_count=None, message=''):
+                self.job.update(
+                    stage=self.STAGES.get(op_code & RemoteProgress.OP_MASK, 'cloning'),
+                    objects_done=int(cur_count),
+                    objects_total=int(max_count) if max_count else None
+                )
+
+        clone_progress_class = CloneProgress
+    return clone_progress_class(job)
+
+
+# Translate /fetch-repo clone options into git clone arguments
+def clone_arguments(depth=0, branch=None, max_blob_size=None, sparse=False):
+    args = []
+    if depth:
+        args.append(f'--depth={depth}')
+    if branch:
+        args += ['--branch', branch, '--single-branch']
+    if max_blob_size:
+        args.append(f'--filter=blob:limit={max_blob_size}')
+    elif sparse:
+        # Only blobs inside the sparse patterns are ever fetched
+        args.append('--filter=blob:none')
+    if max_blob_size or sparse:
+        # A plain checkout would fetch every filtered blob back; partial_checkout picks the paths instead
+        args.append('--no-checkout')
+    return args
+
+
+# Paths at HEAD whose blobs a blob:limit clone left out, found without fetching them
+def missing_blob_paths(repo):
+    objects = repo.git.rev_list('--objects', '--missing=print', '--no-walk', 'HEAD').splitlines()
+    missing = {line[1:] for line in objects if line.startswith('?')}
+    paths = []
+    for entry in repo.git.ls_tree('-r', '-z', 'HEAD').split('\0'):
+        if entry:
+            meta, path = entry.split('\t', 1)
+            if meta.split()[2] in missing:
+                paths.append(path)
+    return paths
+
+
+# Check out only the file types code packs accept (sparse) and/or only the blobs under the size limit
+def partial_checkout(repo, sparse=False, skip_large=False):
+    patterns = [f'*{extension}' for extension in CODE_FILE_EXTENSIONS] if sparse else ['/*']
+    if skip_large:
+        patterns += ['!/' + re.sub(r'([\\*?\[])', r'\\\1', path) for path in missing_blob_paths(repo)]
+    repo.git.config('core.sparseCheckout', 'true')
+    info_dir = os.path.join(repo.git_dir, 'info')
+    os.makedirs(info_dir, exist_ok=True)
+    with open(os.path.join(info_dir, 'sparse-checkout'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(patterns) + '\n')
+    repo.git.read_tree('-mu', 'HEAD')
+
+
+# Clone a repository; with a job, progress is reported and the clone can be cancelled
+def clone_repository(repo_url, repo_fetch_dir, job=None, depth=0, branch=None, max_blob_size=None, sparse=False):
+    args = clone_arguments(depth=depth, branch=branch, max_blob_size=max_blob_size, sparse=sparse)
+    git = lazy_import('git')
+    Repo, Git = git.Repo, git.Git
+    if job is None:
+        repo = Repo.clone_from(repo_url, repo_fetch_dir, multi_options=args)
+    else:
+        Git.check_unsafe_protocols(repo_url)
+        handler = clone_progress(job).new_message_handler()
+        proc = Git().clone('--progress', '-v', *args, '--', repo_url, repo_fetch_dir, as_process=True, universal_newlines=True)
+        stderr_tail = deque(maxlen=20)
+        for line in proc.stderr:
+            stderr_tail.append(line)
+            handler(line)
+            if job.is_cancelled():
+                proc.terminate()
+                break
+        try:
+            proc.wait(stderr=''.join(stderr_tail))
+        except Exception:
+            job.check_cancelled()
+            raise
+        repo = Repo(repo_fetch_dir)
+
+    if max_blob_size or sparse:
+        partial_checkout(repo, sparse=sparse, skip_large=bool(max_blob_size))
+    return repo
+
+
 @app.route('/fetch-repo', methods=['POST'])
 def fetch_repo():
     try:
-        directory_path = 'repofetch'
+        workspace = get_workspace()
+        directory_path = os.path.join(workspace, 'repofetch')
         logging.debug('Entered fetch_repo function')
 
         if os.path.exists(directory_path) and os.path.isdir(directory_path):
             logging.debug(f"The directory '{directory_path}' already exists.")
             return jsonify({"error": "Directory already exists"}), 400
 
-        repo_fetch_dir = os.path.join(os.getcwd(), 'repofetch')
+        # Optional clone options: shallow depth, single branch/ref, blob size filter, sparse checkout
+        try:
+            depth = int(request.form.get('depth', REPO_CLONE_DEPTH))
+        except ValueError:
+            return jsonify({"error": "depth must be an integer"}), 400
+        branch = request.form.get('branch') or None
+        max_blob_size = request.form.get('max_blob_size') or None
+        sparse = request.form.get('sparse', '').lower() in ('1', 'true', 'on', 'yes')
+
+        if depth < 0:
+            return jsonify({"error": "depth must not be negative"}), 400
+        if branch and (branch.startswith('-') or not re.fullmatch(r'[\w./-]+', branch)):
+            return jsonify({"error": "Invalid branch name"}), 400
+        if max_blob_size and not re.fullmatch(r'\d+[kmg]?', max_blob_size.lower()):
+            return jsonify({"error": "max_blob_size must be a size such as 500k or 1m"}), 400
+
+        remaining = workspace_remaining(workspace)
+        if remaining is not None and remaining <= 0:
+            return workspace_quota_response()
+
+        repo_fetch_dir = directory_path
         os.makedirs(repo_fetch_dir, exist_ok=True)
         logging.debug(f"Directory 'repofetch' created at: {repo_fetch_dir}")
 
@@ -517,21 +2596,22 @@ def fetch_repo():
             logging.error("No repository URL provided.")
             return jsonify({"error": "No repository URL provided"}), 400
 
-        try:
+        # Clone in the background; the client polls the job for progress and the file list
+        def run_clone(job):
             logging.info(f"Attempting to clone repository from URL: {repo_url}")
-            repo = Repo.clone_from(repo_url, repo_fetch_dir)
+            clone_repository(repo_url, repo_fetch_dir, job=job, depth=depth, branch=branch, max_blob_size=max_blob_size, sparse=sparse)
             logging.info("Repository successfully cloned.")
-        except Exception as e:
-            logging.error(f"Failed to fetch repository: {e}")
-            return jsonify({"error": str(e)}), 500
+            if remaining is not None and workspace_usage(repo_fetch_dir) > remaining:
+                shutil.rmtree(repo_fetch_dir, ignore_errors=True)
+                raise Exception(f"Repository does not fit in the workspace quota of {WORKSPACE_QUOTA_BYTES} bytes")
 
-        try:
-            files = get_files_in_repofetch()
-            logging.debug(f"Files in 'repofetch': {files}")
-            return jsonify({"message": "Repository successfully fetched", "files": files}), 200
-        except Exception as e:
-            logging.error(f"Error retrieving files from 'repofetch': {e}")
-            return jsonify({"error": str(e)}), 500
+            # Index the clone once; the client pages through it via /repo-index
+            page = repo_index_page(build_repo_index(repo_fetch_dir))
+            logging.debug(f"Indexed {page['total']} files in 'repofetch'")
+            return dict(page, message="Repository successfully fetched")
+
+        job = submit_job('repo_clone', run_clone, workspace=workspace)
+        return job_accepted_response(job, "Repository fetch started")
 
     except Exception as e:
         logging.error(f"Server Error: {e}")
@@ -541,38 +2621,28 @@ def fetch_repo():
 @app.route('/clear-repo', methods=['POST'])
 def clear_repo():
     try:
-        repo_directory_path = 'repofetch'
-        deeplake_directory_path = 'my_deeplake'
+        workspace = get_workspace()
+        repo_directory_path = os.path.join(workspace, 'repofetch')
+        deeplake_directory_path = os.path.join(workspace, 'my_deeplake')
 
         logging.debug("Starting clear_repo function")
 
-        # Attempt to delete the repo directory
-        if os.path.exists(repo_directory_path) and os.path.isdir(repo_directory_path):
-            logging.debug(f"Attempting to delete directory '{repo_directory_path}'")
-            for _ in range(3):  # Retry up to 3 times
-                try:
-                    shutil.rmtree(repo_directory_path)
-                    logging.debug(f"Directory '{repo_directory_path}' deleted successfully")
-                    break
-                except Exception as e:
-                    logging.error(f"Failed to delete directory '{repo_directory_path}': {e}")
-                    time.sleep(1)  # Wait before retrying
-            else:
-                return jsonify({"error": f"Failed to delete directory '{repo_directory_path}' after retries"}), 500
+        # A clone still writing into the workspace has to be cancelled or finish first
+        active_jobs = workspace_jobs(workspace)
+        if active_jobs:
+            return jsonify({"error": "A job is still using this workspace", "job_ids": active_jobs}), 409
 
-        # Attempt to delete the deeplake directory
-        if os.path.exists(deeplake_directory_path) and os.path.isdir(deeplake_directory_path):
-            logging.debug(f"Attempting to delete directory '{deeplake_directory_path}'")
+        # Renaming is atomic and instant; the reaper deletes the contents in the background
+        for directory_path in (repo_directory_path, deeplake_directory_path):
             try:
-                shutil.rmtree(deeplake_directory_path)
-                logging.debug(f"Directory '{deeplake_directory_path}' deleted successfully")
-            except Exception as e:
-                logging.error(f"Failed to delete directory '{deeplake_directory_path}': {e}")
-                return jsonify({"error": f"Failed to delete directory '{deeplake_directory_path}': {e}"}), 500
+                if tombstone(directory_path):
+                    logging.debug(f"Directory '{directory_path}' moved to tombstones")
+            except OSError as e:
+                logging.error(f"Failed to clear directory '{directory_path}': {e}")
+                return jsonify({"error": f"Failed to clear directory '{directory_path}': {e}"}), 500
 
         # Delete processed files metadata
-        main_directory = os.getcwd()
-        file = os.path.join(main_directory, 'processed_files_metadata.json')
+        file = os.path.join(workspace, 'processed_files_metadata.json')
         if os.path.exists(file):
             try:
                 os.remove(file)
@@ -594,31 +2664,31 @@ def del_pack():
     packs = []
     code_packs = []
     if 'access_token' in session:
-        token = session.get('access_token')
-        headers = {'Authorization': f'Bearer {token}'}
-        try:
-            # Fetch regular packs
-            response = requests.get(f"{API_URL}/packman/list_packs", headers=headers)
-            if response.status_code == 200:
-                packs = response.json()
-            else:
-                logger.error(f"Failed to fetch packs: {response.text}")
-                flash('Failed to fetch packs', 'danger')
+        catalog = get_pack_catalog(session.get('access_token'))
+        flash_pack_catalog_errors(catalog)
+        packs = catalog['packs']
+        code_packs = catalog['code_packs']
+    return render_template('del_pack.html', packs=packs, code_packs=code_packs)
 
-            # Fetch code packs
-            response = requests.get(f"{API_URL}/packman/code/list_code_packs", headers=headers)
-            if response.status_code == 200:
-                code_packs = response.json()
-            else:
-                logger.error(f"Failed to fetch code packs: {response.text}")
-                flash('Failed to fetch code packs', 'danger')
 
-        except requests.RequestException as e:
-            logger.error(f"Error fetching packs: {e}")
-            flash('Error fetching packs', 'danger')
-    return render_template('del_pack.html', packs=packs, code_packs=code_packs)
 
 
+# Name of a listed pack, so its delta manifest can be dropped when it is deleted
+def catalog_pack_name(token, listing, pack_id):
+    for pack in get_pack_catalog(token)[listing]:
+        if isinstance(pack, dict) and pack.get('id') == pack_id:
+            return pack.get('pack_name')
+    return None
+
+
+# A deleted pack's next publish has to be a full one
+def remove_pack_manifest(path, token, pack_name):
+    if not pack_name:
+        return
+    try:
+        os.remove(pack_manifest_path(path, token, pack_name))
+    except OSError:
+        pass
 
 
 @app.route('/delete_pack/<int:pack_id>', methods=['DELETE'])
@@ -629,8 +2699,11 @@ def delete_pack(pack_id):
     token = session.get('access_token')
     headers = {'Authorization': f'Bearer {token}'}
     try:
-        response = requests.delete(f"{API_URL}/packman/pack/{pack_id}", headers=headers)
+        pack_name = catalog_pack_name(token, 'packs', pack_id)
+        response = api_delete(f"/packman/pack/{pack_id}", headers=headers)
+        invalidate_pack_catalog(token)
         if response.status_code == 200:
+            remove_pack_manifest("/packman/pack", token, pack_name)
             return jsonify({'message': 'Pack deleted successfully'}), 200
         else:
             logger.error(f"Failed to delete pack: {response.text}")
@@ -649,8 +2722,11 @@ def delete_code_pack(pack_id):
     token = session.get('access_token')
     headers = {'Authorization': f'Bearer {token}'}
     try:
-        response = requests.delete(f"{API_URL}/packman/code_pack/{pack_id}", headers=headers)
+        pack_name = catalog_pack_name(token, 'code_packs', pack_id)
+        response = api_delete(f"/packman/code_pack/{pack_id}", headers=headers)
+        invalidate_pack_catalog(token)
         if response.status_code == 200:
+            remove_pack_manifest("/packman/code_pack", token, pack_name)
             return jsonify({'message': 'Code pack deleted successfully'}), 200
         else:
             logger.error(f"Failed to delete code pack: {response.text}")
@@ -673,7 +2749,7 @@ def login():
         password = request.form.get('password')
 
         try:
-            response = requests.post(f"{API_URL}/login", json={
+            response = api_post("/login", json={
                 'email': email,
                 'password': password
             })
@@ -699,6 +2775,408 @@ def packman():
     return render_template('packman.html')
 
 
+# Upstream pack paths that rejected the chunked upload protocol; these get a single POST
+chunked_publish_unsupported = set()
+
+
+# Staged client uploads: UPLOAD_STAGING_DIR/<upload_id>/ holds an owner file and numbered chunks
+def staged_upload_dir(upload_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id or ''):
+        return None
+    upload_dir = os.path.join(UPLOAD_STAGING_DIR, upload_id)
+    try:
+        with open(os.path.join(upload_dir, 'owner'), 'r', encoding='utf-8') as f:
+            owner = f.read()
+    except OSError:
+        return None
+    if owner != token_cache_key(session.get('access_token', '')):
+        return None
+    return upload_dir
+
+
+def staged_chunk_indexes(upload_dir):
+    return sorted(int(name.split('.')[0]) for name in os.listdir(upload_dir) if name.endswith('.part'))
+
+
+# Staged upload parsed as JSON; chunks are read into one buffer so the bytes are held only once
+def load_staged_upload(upload_dir):
+    data = bytearray()
+    for piece in iter_staged_upload(upload_dir):
+        data += piece
+    return json.loads(data)
+
+
+# Raw bytes of a staged upload, in chunk order
+def iter_staged_upload(upload_dir):
+    for index in staged_chunk_indexes(upload_dir):
+        with open(os.path.join(upload_dir, f"{index:06d}.part"), 'rb') as f:
+            for piece in iter(lambda: f.read(1024 * 1024), b''):
+                yield piece
+
+
+def prune_staged_uploads():
+    if not os.path.isdir(UPLOAD_STAGING_DIR):
+        return
+    cutoff = time.time() - UPLOAD_STAGING_RETENTION_SECONDS
+    for name in os.listdir(UPLOAD_STAGING_DIR):
+        upload_dir = os.path.join(UPLOAD_STAGING_DIR, name)
+        try:
+            if os.path.getmtime(upload_dir) < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+
+@app.route('/packman/uploads', methods=['POST'])
+def create_upload():
+    prune_staged_uploads()
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(UPLOAD_STAGING_DIR, upload_id)
+    os.makedirs(upload_dir)
+    with open(os.path.join(upload_dir, 'owner'), 'w', encoding='utf-8') as f:
+        f.write(token_cache_key(session.get('access_token', '')))
+    return jsonify({'upload_id': upload_id, 'chunk_size': PACK_UPLOAD_CHUNK_BYTES}), 201
+
+
+# Store one chunk of a client upload; gzip bodies are inflated and an optional checksum is verified.
+# Chunks are capped at PACK_UPLOAD_CHUNK_BYTES (plus slack) after inflating, and uploads at
+# PACK_UPLOAD_MAX_CHUNKS chunks and PACK_UPLOAD_MAX_BYTES staged bytes.
+@app.route('/packman/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    upload_dir = staged_upload_dir(upload_id)
+    if upload_dir is None:
+        return jsonify({'message': 'Upload not found'}), 404
+    if index >= PACK_UPLOAD_MAX_CHUNKS:
+        return jsonify({'message': f'Uploads are limited to {PACK_UPLOAD_MAX_CHUNKS} chunks'}), 413
+
+    chunk_path = os.path.join(upload_dir, f"{index:06d}.part")
+    staged = sum(
+        os.path.getsize(os.path.join(upload_dir, f"{i:06d}.part"))
+        for i in staged_chunk_indexes(upload_dir) if i != index
+    )
+    chunk_limit = PACK_UPLOAD_CHUNK_BYTES + 64 * 1024
+    limit = min(chunk_limit, PACK_UPLOAD_MAX_BYTES - staged)
+
+    decompressor = zlib.decompressobj(wbits=31) if request.headers.get('Content-Encoding') == 'gzip' else None
+    digest = hashlib.sha256()
+    tmp_path = f"{chunk_path}.tmp"
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for piece in iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                if decompressor is not None:
+                    # Inflate at most one byte past the limit so a gzip bomb is caught without expanding it
+                    piece = decompressor.decompress(piece, max(limit - written, 0) + 1)
+                written += len(piece)
+                if written > limit:
+                    break
+                digest.update(piece)
+                f.write(piece)
+            if decompressor is not None and written <= limit:
+                piece = decompressor.flush()
+                written += len(piece)
+                digest.update(piece)
+                f.write(piece)
+    except zlib.error as e:
+        os.remove(tmp_path)
+        return jsonify({'message': f'Invalid gzip chunk: {e}'}), 400
+
+    if written > limit:
+        os.remove(tmp_path)
+        if limit < chunk_limit:
+            return jsonify({'message': f'Uploads are limited to {PACK_UPLOAD_MAX_BYTES} bytes'}), 413
+        return jsonify({'message': f'Chunks are limited to {PACK_UPLOAD_CHUNK_BYTES} bytes'}), 413
+    if decompressor is not None and not decompressor.eof:
+        # A body cut off in transit inflates cleanly up to the cut; only the gzip trailer proves it is whole
+        os.remove(tmp_path)
+        return jsonify({'message': 'Invalid gzip chunk: truncated stream'}), 400
+
+    expected = request.headers.get('X-Chunk-Sha256')
+    if expected and expected.lower() != digest.hexdigest():
+        os.remove(tmp_path)
+        return jsonify({'message': 'Chunk checksum mismatch'}), 422
+
+    os.replace(tmp_path, chunk_path)
+    return jsonify({'index': index, 'sha256': digest.hexdigest()}), 200
+
+
+# Which chunks have arrived, so an interrupted client can resend only the missing ones
+@app.route('/packman/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    upload_dir = staged_upload_dir(upload_id)
+    if upload_dir is None:
+        return jsonify({'message': 'Upload not found'}), 404
+    return jsonify({'upload_id': upload_id, 'received': staged_chunk_indexes(upload_dir)}), 200
+
+
+# Cut a byte stream into gzip-compressed chunk files of at most PACK_UPLOAD_CHUNK_BYTES raw bytes
+def write_publish_chunks(byte_pieces, chunk_dir):
+    chunks = []
+    buffer = bytearray()
+
+    def flush(raw):
+        path = os.path.join(chunk_dir, f"{len(chunks):06d}.gz")
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(bytes(raw)))
+        chunks.append({'path': path, 'sha256': hashlib.sha256(raw).hexdigest(), 'size': len(raw)})
+
+    for piece in byte_pieces:
+        buffer += piece
+        while len(buffer) >= PACK_UPLOAD_CHUNK_BYTES:
+            flush(buffer[:PACK_UPLOAD_CHUNK_BYTES])
+            del buffer[:PACK_UPLOAD_CHUNK_BYTES]
+    if buffer or not chunks:
+        flush(buffer)
+    return chunks
+
+
+def send_publish_chunk(path, upload_id, index, chunk, headers):
+    with open(chunk['path'], 'rb') as f:
+        body = f.read()
+    return api_request('PUT', f"{path}/uploads/{upload_id}/chunks/{index}", data=body, headers=dict(
+        headers,
+        **{'Content-Type': 'application/octet-stream', 'Content-Encoding': 'gzip', 'X-Chunk-Sha256': chunk['sha256']}
+    ))
+
+
+# Upload chunks, then ask upstream which arrived and resend only the missing ones
+def send_publish_chunks(path, upload_id, chunks, headers):
+    received = set()
+    for _ in range(PACK_UPLOAD_MAX_ROUNDS):
+        for index, chunk in enumerate(chunks):
+            if index in received:
+                continue
+            try:
+                response = send_publish_chunk(path, upload_id, index, chunk, headers)
+                if response.status_code >= 300:
+                    logger.warning(f"Chunk {index} of upload {upload_id} rejected: {response.text}")
+            except requests.RequestException as e:
+                logger.warning(f"Chunk {index} of upload {upload_id} failed: {e}")
+
+        status = api_get(f"{path}/uploads/{upload_id}", headers=headers)
+        if status.status_code == 200:
+            received = set(status.json().get('received', []))
+        if len(received) >= len(chunks):
+            return True
+    return False
+
+
+# Publish pack contents to the upstream pack endpoint.
+# Contents are sent as compressed, checksummed chunks when upstream supports it.
+def publish_full_pack(path, token, pack_name, contents):
+    headers = {'Authorization': f'Bearer {token}'}
+    byte_pieces = (piece.encode('utf-8') for piece in json.JSONEncoder().iterencode(contents))
+
+    if path not in chunked_publish_unsupported:
+        with tempfile.TemporaryDirectory() as chunk_dir:
+            chunks = write_publish_chunks(byte_pieces, chunk_dir)
+            response = api_post(f"{path}/uploads", json={
+                'pack_name': pack_name,
+                'chunk_count': len(chunks),
+                'total_bytes': sum(chunk['size'] for chunk in chunks),
+                'encoding': 'gzip'
+            }, headers=headers)
+
+            if response.status_code not in (404, 405, 501):
+                if response.status_code != 201:
+                    return response
+                upload_id = response.json().get('upload_id')
+                if not send_publish_chunks(path, upload_id, chunks, headers):
+                    raise requests.RequestException(f"Upload {upload_id} still incomplete after {PACK_UPLOAD_MAX_ROUNDS} rounds")
+                return api_post(f"{path}/uploads/{upload_id}/complete", headers=headers)
+
+        logger.info(f"Upstream does not support chunked uploads for {path}; using a single request")
+        chunked_publish_unsupported.add(path)
+
+    return api_post(path, json={
+        'pack_name': pack_name,
+        'contents': contents
+    }, headers=dict(headers, **{'Content-Type': 'application/json'}))
+
+
+# Language-aware splitters for the code extensions read_files accepts (values are
+# langchain_text_splitters.Language names with separators in the pinned version; C uses the C++
+# separators, and Perl has none, so .pl files get the generic splitter)
+CODE_SPLITTER_LANGUAGES = {
+    '.py': 'python', '.js': 'js', '.jsx': 'js', '.ts': 'ts', '.tsx': 'ts',
+    '.cpp': 'cpp', '.c': 'cpp', '.h': 'cpp', '.java': 'java', '.rb': 'ruby',
+    '.php': 'php', '.go': 'go', '.swift': 'swift', '.rs': 'rust',
+    '.kt': 'kotlin', '.lua': 'lua', '.md': 'markdown', '.html': 'html'
+}
+
+
+# Runs in the extraction process pool; returns (start, end) offsets rather than chunk text
+def split_text_spans(content, language, chunk_size, chunk_overlap):
+    text_splitters = lazy_import('langchain_text_splitters')
+    RecursiveCharacterTextSplitter = text_splitters.RecursiveCharacterTextSplitter
+    if language:
+        splitter = RecursiveCharacterTextSplitter.from_language(
+            text_splitters.Language(language), chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+        )
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    return [
+        (doc.metadata['start_index'], doc.metadata['start_index'] + len(doc.page_content))
+        for doc in splitter.create_documents([content])
+    ]
+
+
+def chunk_metadata(content, spans):
+    chunks = []
+    line = 1
+    position = 0
+    for index, (start, end) in enumerate(spans):
+        # Spans are ordered, so line numbers can be counted incrementally
+        line += content.count('\n', position, start)
+        position = start
+        chunks.append({
+            'index': index,
+            'start': start,
+            'end': end,
+            'start_line': line,
+            'end_line': line + content.count('\n', start, end)
+        })
+    return chunks
+
+
+# Attach chunk offsets to every text entry. Splitting runs in the worker pool and results are cached
+# by content hash, so unchanged files are not split again on republish.
+def chunk_pack_contents(contents, code=False):
+    pending = []
+    chunked = []
+    for entry in contents:
+        content = entry.get('content') if isinstance(entry, dict) else None
+        if not isinstance(content, str) or not content or entry.get('is_binary'):
+            chunked.append(entry)
+            continue
+
+        language = None
+        if code:
+            language = CODE_SPLITTER_LANGUAGES.get(os.path.splitext(entry.get('filename') or '')[1].lower())
+        splitter = language or 'text'
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        cache_key = hashlib.sha256(f"chunks:{splitter}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:{content_hash}".encode('utf-8')).hexdigest()
+        entry = dict(entry, chunking={'splitter': splitter, 'chunk_size': CHUNK_SIZE, 'chunk_overlap': CHUNK_OVERLAP})
+        chunked.append(entry)
+
+        cached = load_cached_extraction(cache_key)
+        if cached is not None:
+            entry['chunks'] = chunk_metadata(content, cached['spans'])
+            continue
+        pending.append((entry, cache_key, submit_extraction(split_text_spans, content, language, CHUNK_SIZE, CHUNK_OVERLAP)))
+
+    for entry, cache_key, task in pending:
+        try:
+            spans = extraction_result(task)
+        except Exception as e:
+            # An entry that cannot be split is still published, just without chunks
+            logger.error(f"Error chunking {entry.get('filename') or entry.get('data_type')}: {str(e) or type(e).__name__}")
+            del entry['chunking']
+            continue
+        store_cached_extraction(cache_key, {'spans': spans})
+        entry['chunks'] = chunk_metadata(entry['content'], spans)
+    return chunked
+
+
+# Upstream pack paths that rejected delta publishing; these always get full publishes
+delta_publish_unsupported = set()
+
+
+# Manifests belong to the user (not the token) so they survive logging in again
+def pack_manifest_path(path, token, pack_name):
+    kind = path.strip('/').replace('/', '_')
+    name_hash = hashlib.sha256(pack_name.encode('utf-8')).hexdigest()
+    return os.path.join(PACK_MANIFEST_DIR, user_storage_key(token), f"{kind}-{name_hash}.json")
+
+
+def load_pack_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_pack_manifest(manifest_path, entry_hashes):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry_hashes, f)
+    os.replace(tmp_path, manifest_path)
+
+
+# Fingerprint of a whole manifest, so upstream can check the delta applies to what it holds
+def pack_manifest_digest(entry_hashes):
+    return hashlib.sha256(json.dumps(sorted(entry_hashes.items())).encode('utf-8')).hexdigest()
+
+
+# Hash every entry and drop exact duplicates; entries are keyed by filename when they have one
+def dedupe_pack_contents(contents):
+    unique_contents = []
+    entry_hashes = {}
+    for entry in contents:
+        entry_hash = hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
+        key = entry.get('filename') if isinstance(entry, dict) and entry.get('filename') else f"hash:{entry_hash}"
+        if entry_hashes.get(key) == entry_hash:
+            continue
+        if key in entry_hashes:
+            # Same filename with different content: keep both under distinct keys
+            key = f"{key}#{entry_hash[:12]}"
+        entry_hashes[key] = entry_hash
+        unique_contents.append((key, entry_hash, entry))
+    return unique_contents, entry_hashes
+
+
+# Send only added, changed and removed entries; returns None when a full publish is needed
+def publish_pack_delta(path, token, pack_name, manifest, unique_contents, entry_hashes):
+    added = [dict(entry, entry_key=key, entry_hash=entry_hash) for key, entry_hash, entry in unique_contents if key not in manifest]
+    changed = [
+        dict(entry, entry_key=key, entry_hash=entry_hash)
+        for key, entry_hash, entry in unique_contents
+        if key in manifest and manifest[key] != entry_hash
+    ]
+    removed = [key for key in manifest if key not in entry_hashes]
+
+    response = api_post(f"{path}/delta", json={
+        'pack_name': pack_name,
+        'base_manifest': pack_manifest_digest(manifest),
+        'manifest': entry_hashes,
+        'added': added,
+        'changed': changed,
+        'removed': removed
+    }, headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
+
+    if response.status_code in (405, 501):
+        logger.info(f"Upstream does not support delta publishing for {path}; sending full packs")
+        delta_publish_unsupported.add(path)
+        return None
+    if response.status_code in (404, 409):
+        # Upstream has no such pack (it was deleted elsewhere) or holds a different base than our
+        # manifest; resynchronise with a full publish
+        return None
+    return response
+
+
+# Publish a pack, sending only what changed since the last publish of the same pack when possible
+def publish_pack(path, token, pack_name, contents):
+    unique_contents, entry_hashes = dedupe_pack_contents(contents)
+    manifest_path = pack_manifest_path(path, token, pack_name)
+    manifest = load_pack_manifest(manifest_path)
+
+    response = None
+    if manifest and path not in delta_publish_unsupported:
+        response = publish_pack_delta(path, token, pack_name, manifest, unique_contents, entry_hashes)
+    if response is None:
+        response = publish_full_pack(path, token, pack_name, [entry for _, _, entry in unique_contents])
+
+    if response.status_code == 201:
+        try:
+            save_pack_manifest(manifest_path, entry_hashes)
+        except OSError as e:
+            logger.warning(f"Could not save pack manifest for {pack_name}: {e}")
+    return response
+
+
 @app.route('/packman/package_pack', methods=['POST'])
 def package_pack():
     token = session.get('access_token')
@@ -707,46 +3185,441 @@ def package_pack():
     pack_name = data.get('pack_name')
     contents = data.get('contents')
 
-    if not pack_name or not contents:
-        return jsonify({'message': 'Pack name and contents are required'}), 400
+    # Large packs may have been uploaded in chunks beforehand
+    upload_dir = None
+    if data.get('upload_id'):
+        upload_dir = staged_upload_dir(data.get('upload_id'))
+        if upload_dir is None or not staged_chunk_indexes(upload_dir):
+            return jsonify({'message': 'Upload not found'}), 404
 
-    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    if not pack_name or not (contents or upload_dir):
+        return jsonify({'message': 'Pack name and contents are required'}), 400
 
     try:
-        response = requests.post(f"{API_URL}/packman/pack", json={
-            'pack_name': pack_name,
-            'contents': contents
-        }, headers=headers)
+        # Staged uploads are parsed like inline contents so they are deduplicated and sent as deltas too
+        if upload_dir is not None:
+            contents = load_staged_upload(upload_dir)
+        if not isinstance(contents, list):
+            return jsonify({'message': 'Pack contents must be a list'}), 400
+        if data.get('chunk', PACK_CHUNKING_DEFAULT):
+            contents = chunk_pack_contents(contents)
+        response = publish_pack("/packman/pack", token, pack_name, contents)
+        invalidate_pack_catalog(token)
+        if upload_dir is not None and response.status_code == 201:
+            shutil.rmtree(upload_dir, ignore_errors=True)
 
         if response.status_code != 201:
             logger.error(f"Failed to process pack: {response.text}")
             return jsonify({'message': 'Failed to process pack'}), 500
 
         return jsonify(response.json()), 201
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"Error processing pack: {e}")
         return jsonify({'message': 'Error processing pack'}), 500
 
 
 
 
+# aiohttp runs on one event loop thread per worker process, shared by all preview requests
+crawl_loop = None
+crawl_loop_pid = None
+crawl_loop_lock = threading.Lock()
+crawl_session = None
+crawl_hosts = {}
+robots_cache = TTLCache(maxsize=1024, ttl=ROBOTS_CACHE_TTL)
+crawl_cache_pruned_at = 0.0
+
+
+def get_crawl_loop():
+    global crawl_loop, crawl_loop_pid, crawl_session
+    with crawl_loop_lock:
+        # The loop thread does not survive a fork into a gunicorn worker
+        if crawl_loop is None or crawl_loop_pid != os.getpid():
+            crawl_loop = asyncio.new_event_loop()
+            crawl_session = None
+            crawl_hosts.clear()
+            threading.Thread(target=crawl_loop.run_forever, name='crawl-loop', daemon=True).start()
+            crawl_loop_pid = os.getpid()
+        return crawl_loop
+
+
+def run_crawl(coro, timeout):
+    future = asyncio.run_coroutine_threadsafe(coro, get_crawl_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+# Only called on the loop thread, so the session needs no lock
+def get_crawl_session():
+    global crawl_session
+    if crawl_session is None or crawl_session.closed:
+        aiohttp = lazy_import('aiohttp')
+        crawl_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CRAWL_CONCURRENCY, limit_per_host=CRAWL_HOST_CONCURRENCY, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=CRAWL_TIMEOUT),
+            headers={'User-Agent': CRAWL_USER_AGENT}
+        )
+    return crawl_session
+
+
+# Space out requests to the same host by the configured interval or its robots.txt crawl delay
+async def wait_for_host_slot(host, interval):
+    state = crawl_hosts.setdefault(host, {'lock': asyncio.Lock(), 'next_at': 0.0})
+    async with state['lock']:
+        loop = asyncio.get_running_loop()
+        delay = state['next_at'] - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        state['next_at'] = loop.time() + interval
+
+
+async def fetch_robots(origin):
+    parser = robots_cache.get(origin)
+    if parser is not None:
+        return parser
+
+    parser = urllib.robotparser.RobotFileParser(f"{origin}/robots.txt")
+    aiohttp = lazy_import('aiohttp')
+    try:
+        async with get_crawl_session().get(f"{origin}/robots.txt") as response:
+            if response.status in (401, 403):
+                parser.disallow_all = True
+            elif response.status >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse((await response.text(errors='replace')).splitlines())
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.info(f"Could not fetch robots.txt for {origin}: {e}")
+        parser.allow_all = True
+    robots_cache.set(origin, parser)
+    return parser
+
+
+def crawl_cache_path(url):
+    return os.path.join(CRAWL_CACHE_DIR, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+
+def load_crawl_cache(url):
+    try:
+        with open(crawl_cache_path(url), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_crawl_cache(url, entry):
+    global crawl_cache_pruned_at
+    os.makedirs(CRAWL_CACHE_DIR, exist_ok=True)
+    cache_path = crawl_cache_path(url)
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, cache_path)
+
+    # Entries past their TTL are kept for revalidation until the retention window runs out
+    now = time.time()
+    if now - crawl_cache_pruned_at < 3600:
+        return
+    crawl_cache_pruned_at = now
+    for name in os.listdir(CRAWL_CACHE_DIR):
+        path = os.path.join(CRAWL_CACHE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > CRAWL_CACHE_RETENTION_SECONDS:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+# Fetch one page, serving fresh cache entries directly and revalidating stale ones with ETag/Last-Modified
+async def fetch_page(url, interval):
+    entry = await asyncio.to_thread(load_crawl_cache, url)
+    if entry and time.time() - entry['fetched_at'] < CRAWL_CACHE_TTL:
+        return dict(entry, cached=True)
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    await wait_for_host_slot(urlparse(url).netloc, interval)
+    async with get_crawl_session().get(url, headers=headers) as response:
+        if response.status == 304 and entry:
+            entry['fetched_at'] = time.time()
+            await asyncio.to_thread(store_crawl_cache, url, entry)
+            return dict(entry, cached=True)
+        if response.status >= 400:
+            return {'url': url, 'error': f"HTTP {response.status}"}
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and not content_type.startswith('text/') and content_type != 'application/xhtml+xml':
+            return {'url': url, 'error': f"Unsupported content type {content_type}"}
+
+        body = await response.content.read(CRAWL_MAX_PAGE_BYTES)
+        try:
+            text = body.decode(response.charset) if response.charset else decode_file_bytes(body)[0]
+        except (LookupError, UnicodeDecodeError):
+            text = decode_file_bytes(body)[0]
+
+        entry = {
+            'url': str(response.url),
+            'content_type': content_type or 'text/html',
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'body': text
+        }
+        if 'no-store' not in response.headers.get('Cache-Control', ''):
+            await asyncio.to_thread(store_crawl_cache, url, entry)
+        return dict(entry, cached=False)
+
+
+# Elements whose text is never page content
+HTML_SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object', 'head', 'select', 'button'}
+# Page chrome around the main content
+HTML_BOILERPLATE_TAGS = {'nav', 'header', 'footer', 'aside', 'form', 'dialog'}
+HTML_BOILERPLATE_PATTERN = re.compile(
+    r'(^|[\s_-])(nav|navbar|menu|sidebar|footer|header|breadcrumbs?|cookie|banner|advert|ads|share|social|comments?|related|skip-link|toc)($|[\s_-])',
+    re.IGNORECASE
+)
+HTML_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'dl', 'dt', 'dd', 'table', 'tr', 'td', 'th',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'figcaption', 'br', 'hr', 'title'
+}
+HTML_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+# Single streaming pass over the HTML: collects links everywhere, and text blocks outside boilerplate.
+# Elements that only look like chrome by class/id are kept provisionally: their blocks are dropped when
+# they close, unless a main/article element turned up inside them (themes wrap the content in
+# containers such as "wy-grid-for-nav" or "page has-sidebar"). If that would leave a page with no
+# text at all, parse_page falls back to all_blocks, which keeps them.
+class PageTextParser(HTMLParser):
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links = []
+        self.blocks = []
+        # Every block outside hard-skipped elements, including those of dropped provisional frames
+        self.all_blocks = []
+        self.main_blocks = []
+        self.stack = []
+        self.skip_depth = None
+        self.main_depth = None
+        self.pre_depth = None
+        self.provisional = []
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'base' and attrs.get('href'):
+            self.base_url = urljoin(self.base_url, attrs['href'])
+        elif tag == 'a' and attrs.get('href'):
+            self.links.append(attrs['href'])
+
+        if tag in HTML_BLOCK_TAGS:
+            self.flush()
+        if tag in HTML_VOID_TAGS:
+            return
+
+        self.stack.append(tag)
+        depth = len(self.stack)
+        is_main = tag in ('main', 'article') or attrs.get('role') == 'main'
+        if self.skip_depth is None:
+            marker = f"{attrs.get('class') or ''} {attrs.get('id') or ''} {attrs.get('role') or ''}"
+            if tag in HTML_SKIPPED_TAGS or tag in HTML_BOILERPLATE_TAGS:
+                self.skip_depth = depth
+            elif tag not in ('html', 'body') and not is_main and HTML_BOILERPLATE_PATTERN.search(marker):
+                self.flush()
+                self.provisional.append({
+                    'depth': depth, 'blocks': len(self.blocks), 'main_blocks': len(self.main_blocks), 'keep': False
+                })
+        if self.skip_depth is None and is_main:
+            for frame in self.provisional:
+                frame['keep'] = True
+            if self.main_depth is None:
+                self.main_depth = depth
+        if self.pre_depth is None and tag == 'pre':
+            self.pre_depth = depth
+
+    def handle_endtag(self, tag):
+        if tag in HTML_BLOCK_TAGS:
+            self.flush()
+        if tag not in self.stack:
+            return
+        # Implicitly close anything left open inside this element
+        while self.stack:
+            depth = len(self.stack)
+            if self.skip_depth is not None and depth <= self.skip_depth:
+                self.skip_depth = None
+            if self.main_depth is not None and depth <= self.main_depth:
+                self.flush()
+                self.main_depth = None
+            if self.pre_depth is not None and depth <= self.pre_depth:
+                self.pre_depth = None
+            if self.provisional and depth <= self.provisional[-1]['depth']:
+                self.flush()
+                frame = self.provisional.pop()
+                if not frame['keep']:
+                    del self.blocks[frame['blocks']:]
+                    del self.main_blocks[frame['main_blocks']:]
+            if self.stack.pop() == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip_depth is None:
+            self.buffer.append(data)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        text = ''.join(self.buffer)
+        self.buffer = []
+        if self.pre_depth is not None:
+            text = text.strip('\n').rstrip()
+        else:
+            text = ' '.join(text.split())
+        if not text:
+            return
+        self.blocks.append(text)
+        self.all_blocks.append(text)
+        if self.main_depth is not None:
+            self.main_blocks.append(text)
+
+    def close(self):
+        super().close()
+        self.flush()
+
+
+# Main text of a page (boilerplate stripped, whitespace normalized, repeated blocks dropped)
+# and the crawlable links it contains
+def parse_page(body, base_url, content_type):
+    started = time.perf_counter()
+    if content_type not in ('text/html', 'application/xhtml+xml'):
+        text = re.sub(r'[ \t]+', ' ', body).strip()
+        return text, [], (time.perf_counter() - started) * 1000
+
+    parser = PageTextParser(base_url)
+    parser.feed(body)
+    parser.close()
+
+    seen_blocks = set()
+    unique_blocks = []
+    # A page whose content sits in a chrome-looking wrapper (and no main element) keeps that wrapper's text
+    for block in parser.main_blocks or parser.blocks or parser.all_blocks:
+        if block not in seen_blocks:
+            seen_blocks.add(block)
+            unique_blocks.append(block)
+
+    links = []
+    for href in parser.links:
+        link = urldefrag(urljoin(parser.base_url, href))[0]
+        if urlparse(link).scheme in ('http', 'https'):
+            links.append(link)
+    return '\n'.join(unique_blocks), links, (time.perf_counter() - started) * 1000
+
+
+async def crawl_page(url, interval):
+    page = await fetch_page(url, interval)
+    if 'error' in page:
+        return page, []
+    text, links, extract_ms = await asyncio.to_thread(parse_page, page['body'], page['url'], page['content_type'])
+    if not text:
+        return {'url': page['url'], 'error': 'No text content found on page'}, []
+    return {'url': page['url'], 'content': text, 'cached': page['cached'], 'extract_ms': round(extract_ms, 2)}, links
+
+
+# Breadth-first crawl of the start URL's host, fetching each depth level concurrently
+async def crawl_site(start_url, max_depth, max_pages):
+    aiohttp = lazy_import('aiohttp')
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CRAWL_TOTAL_TIMEOUT
+    start = urlparse(start_url)
+    host = start.netloc
+    robots = await fetch_robots(f"{start.scheme}://{host}")
+    interval = max(CRAWL_HOST_INTERVAL, robots.crawl_delay(CRAWL_USER_AGENT) or 0)
+
+    seen = {start_url}
+    frontier = [start_url]
+    pages, errors = [], []
+    for depth in range(max_depth + 1):
+        allowed = []
+        for url in frontier:
+            if robots.can_fetch(CRAWL_USER_AGENT, url):
+                allowed.append(url)
+            else:
+                errors.append({'url': url, 'error': 'Disallowed by robots.txt'})
+        allowed = allowed[:max_pages - len(pages)]
+        if not allowed:
+            break
+
+        tasks = [asyncio.ensure_future(crawl_page(url, interval)) for url in allowed]
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - loop.time()))
+
+        next_frontier = []
+        for url, task in zip(allowed, tasks):
+            if task in pending:
+                task.cancel()
+                errors.append({'url': url, 'error': 'Crawl time limit reached'})
+                continue
+            try:
+                page, links = task.result()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                errors.append({'url': url, 'error': str(e) or type(e).__name__})
+                continue
+            if 'error' in page:
+                errors.append(page)
+                continue
+
+            pages.append(dict(page, depth=depth))
+            seen.add(page['url'])
+            if depth == 0:
+                # Follow the host the start URL redirected to
+                host = urlparse(page['url']).netloc
+            for link in links:
+                if urlparse(link).netloc == host and link not in seen:
+                    seen.add(link)
+                    next_frontier.append(link)
+
+        if pending:
+            break
+        frontier = next_frontier
+    return pages, errors
+
+
 @app.route('/packman/preview_link', methods=['POST'])
 def preview_link():
     link = request.json.get('link')
     if not link:
         return jsonify({'message': 'Link is required'}), 400
+    parsed = urlparse(link)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return jsonify({'message': 'Link must be an http or https URL'}), 400
 
     try:
-        loader = WebBaseLoader(link)
-        docs = loader.load()
-
-        docs_json = [{'url': doc.metadata.get('url'), 'content': doc.page_content} for doc in docs]
+        depth = min(int(request.json.get('depth', 0)), CRAWL_MAX_DEPTH)
+        max_pages = min(int(request.json.get('max_pages', CRAWL_MAX_PAGES)), CRAWL_MAX_PAGES)
+    except (TypeError, ValueError):
+        return jsonify({'message': 'depth and max_pages must be integers'}), 400
+    if depth < 0 or max_pages < 1:
+        return jsonify({'message': 'depth must be 0 or more and max_pages at least 1'}), 400
 
-        return jsonify({'message': 'Link processed successfully', 'docs': docs_json})
+    try:
+        started = time.monotonic()
+        pages, errors = run_crawl(crawl_site(urldefrag(link)[0], depth, max_pages), CRAWL_TOTAL_TIMEOUT + CRAWL_TIMEOUT)
+        extract_ms = sum(page['extract_ms'] for page in pages)
+        logger.info(f"Crawled {len(pages)} pages from {link} in {time.monotonic() - started:.2f}s ({extract_ms:.1f}ms extracting, {len(errors)} errors)")
     except Exception as e:
         logger.error(f"Error processing link: {e}")
         return jsonify({'message': 'Error processing link'}), 500
 
+    if not pages:
+        return jsonify({'message': 'Error processing link', 'errors': errors}), 502
+    return jsonify({'message': 'Link processed successfully', 'docs': pages, 'errors': errors})
+
 
 
 @app.route('/packman/preview_file', methods=['POST'])
@@ -758,10 +3631,27 @@ def preview_file():
     if file.filename == '':
         return jsonify({'message': 'No selected file'}), 400
 
+    if upload_size(file) > UPLOAD_MAX_FILE_BYTES:
+        return jsonify({'message': f'File is larger than {UPLOAD_MAX_FILE_BYTES} bytes'}), 413
+
+    if file.filename.lower().endswith('.pdf'):
+        try:
+            return jsonify({'message': 'File processed successfully', 'content': extract_upload_pdf_text(file)})
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.filename}: {str(e) or type(e).__name__}")
+            return jsonify({'message': 'Could not extract text from the PDF'}), 422
+    if upload_is_binary(file):
+        return jsonify({'message': 'File is not a text file'}), 415
+
     try:
-        content = file.read().decode('utf-8')  # Assuming text files for simplicity
+        encoding = detect_upload_encoding(file)
+
+        def generate():
+            yield '{"message": "File processed successfully", "content": '
+            yield from iter_json_string(iter_decoded_upload(file, encoding))
+            yield '}'
 
-        return jsonify({'message': 'File processed successfully', 'content': content})
+        return app.response_class(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         return jsonify({'message': 'Error processing file'}), 500
@@ -775,19 +3665,16 @@ def list_packs():
         flash('You need to login first', 'danger')
         return redirect(url_for('login'))
 
-    headers = {'Authorization': f'Bearer {token}'}
-    try:
-        response = requests.get(f"{API_URL}/packman/list_packs", headers=headers)
-
-        if response.status_code == 200:
-            packs = response.json()
-            return jsonify(packs)
-        else:
-            logger.error(f"Failed to fetch packs: {response.text}")
-            flash('Failed to fetch packs', 'danger')
-            return jsonify({'message': 'Failed to fetch packs'}), 500
-    except requests.RequestException as e:
-        logger.error(f"Error fetching packs: {e}")
+    catalog = get_pack_catalog(token)
+    error = catalog['errors'].get('packs')
+    if error is None:
+        return jsonify(catalog['packs'])
+    elif error['kind'] == 'failed':
+        logger.error(f"Failed to fetch packs: {error['detail']}")
+        flash('Failed to fetch packs', 'danger')
+        return jsonify({'message': 'Failed to fetch packs'}), 500
+    else:
+        logger.error(f"Error fetching packs: {error['detail']}")
         flash('Error fetching packs', 'danger')
         return jsonify({'message': 'Error fetching packs'}), 500
 
@@ -800,17 +3687,29 @@ def package_code_pack():
     pack_name = data.get('pack_name')
     contents = data.get('contents')
 
-    if not pack_name or not contents:
+    # Large packs may have been uploaded in chunks beforehand
+    upload_dir = None
+    if data.get('upload_id'):
+        upload_dir = staged_upload_dir(data.get('upload_id'))
+        if upload_dir is None or not staged_chunk_indexes(upload_dir):
+            return jsonify({'message': 'Upload not found'}), 404
+
+    if not pack_name or not (contents or upload_dir):
         flash('Pack name and contents are required', 'danger')
         return jsonify({'message': 'Pack name and contents are required'}), 400
 
-    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-
     try:
-        response = requests.post(f"{API_URL}/packman/code_pack", json={
-            'pack_name': pack_name,
-            'contents': contents
-        }, headers=headers)
+        # Staged uploads are parsed like inline contents so they are deduplicated and sent as deltas too
+        if upload_dir is not None:
+            contents = load_staged_upload(upload_dir)
+        if not isinstance(contents, list):
+            return jsonify({'message': 'Pack contents must be a list'}), 400
+        if data.get('chunk', PACK_CHUNKING_DEFAULT):
+            contents = chunk_pack_contents(contents, code=True)
+        response = publish_pack("/packman/code_pack", token, pack_name, contents)
+        invalidate_pack_catalog(token)
+        if upload_dir is not None and response.status_code == 201:
+            shutil.rmtree(upload_dir, ignore_errors=True)
 
         if response.status_code != 201:
             logger.error(f"Failed to process code pack: {response.text}")
@@ -819,7 +3718,7 @@ def package_code_pack():
 
         flash('Code pack published successfully!', 'success')
         return jsonify(response.json()), 201
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"Error processing code pack: {e}")
         flash('Error processing code pack', 'danger')
         return jsonify({'message': 'Error processing code pack'}), 500
@@ -827,15 +3726,93 @@ def package_code_pack():
 
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = load_job(job_id)
+    if job is None or job.pop('owner') != token_cache_key(session.get('access_token', '')):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+
+# Server-sent events stream of job snapshots until the job finishes
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    owner = token_cache_key(session.get('access_token', ''))
+    job = load_job(job_id)
+    if job is None or job['owner'] != owner:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        last_payload = None
+        while True:
+            job = load_job(job_id)
+            if job is None:
+                break
+            job.pop('owner')
+            payload = json.dumps(job)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if job['status'] in JOB_FINISHED_STATES:
+                break
+            time.sleep(1)
+
+    return app.response_class(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = load_job(job_id)
+    if job is None or job['owner'] != token_cache_key(session.get('access_token', '')):
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in JOB_FINISHED_STATES:
+        return jsonify({'error': f"Job already {job['status']}"}), 409
+
+    open(job_cancel_path(job_id), 'w').close()
+    return jsonify({'message': 'Cancellation requested'}), 202
+
+
+@app.route('/metrics/upstream')
+def upstream_metrics():
+    with upstream_stats_lock:
+        metrics = {
+            label: dict(stats, avg_ms=stats['total_ms'] / stats['count'] if stats['count'] else 0.0)
+            for label, stats in upstream_stats.items()
+        }
+    return jsonify(metrics), 200
+
+
+@app.route('/metrics/imports')
+def import_metrics():
+    return jsonify({
+        'app_import_ms': app_import_ms,
+        'preloaded': PRELOAD_INTEGRATIONS,
+        # None: not loaded yet; 0.0: loaded along with another integration
+        'integrations': {name: import_timings.get(name, 0.0 if name in sys.modules else None) for name in LAZY_INTEGRATIONS},
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }), 200
+
+
 @app.route('/logout')
 def logout():
-    session.pop('access_token', None)
+    token = session.pop('access_token', None)
+    if token:
+        auth_cache.pop(token_cache_key(token))
+        premium_cache.pop(token_cache_key(token))
+        invalidate_pack_catalog(token)
     flash('Logged out successfully!', 'success')
     return redirect(url_for('home'))
 
 
 
 
+if PRELOAD_INTEGRATIONS:
+    for name in LAZY_INTEGRATIONS:
+        lazy_import(name)
+app_import_ms = round((time.perf_counter() - app_import_started) * 1000, 1)
+logger.info(f"App imported in {app_import_ms}ms" + (f"; preloaded integrations: {import_timings}" if PRELOAD_INTEGRATIONS else ''))
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=True, use_reloader=False, host="0.0.0.0", port=port) #was port 80
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+
+# Gunicorn settings for serving Packman. Almost every request waits on the network (the SourceBox API,
+# S3, git, crawled sites), so each worker process runs a pool of threads rather than handling one
+# request at a time. Concurrent requests per dyno = GUNICORN_WORKERS x GUNICORN_THREADS.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Heroku sets WEB_CONCURRENCY from the dyno size
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WEB_CONCURRENCY', 2)))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 64))
+# Only used by async worker classes
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Slow work runs as background jobs, so a request only needs to outlast one upstream round trip
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Worker recycling is off by default. Background jobs (bucket dumps, clones) run inside the worker
+# process and do not survive a recycle: they are killed after graceful_timeout and reported as failed.
+# Set GUNICORN_MAX_REQUESTS to recycle workers anyway, e.g. to bound a leak in a parser.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+# Import the app once in the master and fork workers from it; with PRELOAD_INTEGRATIONS=true the
+# heavy integrations are then loaded once and shared copy-on-write instead of per worker
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+# Give every thread its own upstream connection instead of discarding connections when the pool is full.
+# This file runs before the app is imported, so the app picks these defaults up.
+os.environ.setdefault('UPSTREAM_POOL_SIZE', str(threads))
+os.environ.setdefault('S3_MAX_POOL_CONNECTIONS', str(max(threads, 32)))